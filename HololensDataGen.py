@@ -3,19 +3,420 @@ Data Generatior code for PAV graphics and animation
 Contributers: Allen Black, Jordan Boulanger
 Creation Date: 10/26/2016
 Last Modified Date: 02/26/17
-Description: There are 6 sets of data that are generated randomly, but form a general pattern by using previous values to generate future values.
+Description: There are 6 sets of data (channels, more can be registered) that are generated randomly, but form a general pattern by using previous values to generate future values.
 These sets of data are then parsed through and one-by-one, each data point in the set
 is converted to JSON and then sent as a message via UDP
+PAVReceiver (python HololensDataGen.py receive --port 1111) stands in for the hololens to check what arrives
 """
 
 import unittest
+import argparse
 import random
 import string
 import time
 import json
+import math
+import hashlib
+import itertools
+import struct
 import socket
 import threading
+import multiprocessing
+import concurrent.futures
+import asyncio
+import queue
+import collections
+import ctypes
+import ctypes.util
+import os
+import sys
+import errno
+import select
+import ipaddress
+import http.server
+import mmap
+import urllib.request
+import tempfile
+import shutil
 
+try:
+    import numpy
+except ImportError:
+    numpy = None  # the batch engine is unavailable without numpy
+
+
+
+def _composeWalkSteps(first, then):
+    """
+    Composes two clamped walk steps into one.
+    A step is a tuple of arrays (shift, lower, upper) describing x -> clip(x + shift, lower, upper),
+    the result applies the step first and then the step then
+    """
+
+    shift = first[0] + then[0]
+    lower = numpy.minimum(numpy.maximum(first[1] + then[0], then[1]), then[2])
+    upper = numpy.minimum(numpy.maximum(first[2] + then[0], then[1]), then[2])
+    return shift, lower, upper
+
+
+def _composeAffineSteps(first, then):
+    """
+    Composes two affine steps into one.
+    A step is a tuple of arrays (scale, offset) describing x -> scale * x + offset,
+    the result applies the step first and then the step then
+    """
+
+    return first[0] * then[0], first[1] * then[0] + then[1]
+
+
+def _scanSteps(steps, compose=_composeWalkSteps):
+    """
+    Inclusive prefix scan along the last axis of steps (a tuple of arrays) under an associative compose.
+    Adjacent steps are composed pairwise and the half length problem is solved recursively,
+    so the whole scan costs O(n) array work in O(log n) vectorized passes
+    """
+
+    length = steps[0].shape[-1]
+    if length == 1:
+        return steps
+
+    pairs = length // 2
+    evens = tuple(part[..., 0:2 * pairs:2] for part in steps)
+    odds = tuple(part[..., 1:2 * pairs:2] for part in steps)
+    pairPrefix = _scanSteps(compose(evens, odds), compose)
+
+    prefix = tuple(numpy.empty_like(part) for part in steps)
+    remaining = (length - 1) // 2
+    evenPrefix = compose(
+        tuple(part[..., :remaining] for part in pairPrefix),
+        tuple(part[..., 2::2] for part in steps))
+    for index in range(len(steps)):
+        prefix[index][..., 0] = steps[index][..., 0]
+        prefix[index][..., 1::2] = pairPrefix[index]
+        prefix[index][..., 2::2] = evenPrefix[index]
+    return prefix
+
+
+def _clampedWalk(first, steps, lower, upper):
+    """
+    Vectorized bounded random walk along the last axis of steps
+    Element 0 is first, every following element is the previous one moved by steps and clamped to [lower, upper]
+    @param first: The starting values (array, one per walk)
+    @param steps: The random steps (array, the step at index 0 is ignored)
+    @param lower: The lowest value of each walk (array broadcastable to first)
+    @param upper: The highest value of each walk (array broadcastable to first)
+    @return: An array shaped like steps holding every walk
+    """
+
+    shift = numpy.array(steps, dtype=float)
+    lower = numpy.array(numpy.broadcast_to(numpy.asarray(lower, dtype=float)[..., None], shift.shape))
+    upper = numpy.array(numpy.broadcast_to(numpy.asarray(upper, dtype=float)[..., None], shift.shape))
+
+    # the first step ignores its input, which anchors every prefix to the starting value
+    shift[..., 0] = 0
+    lower[..., 0] = first
+    upper[..., 0] = first
+
+    shift, lower, upper = _scanSteps((shift, lower, upper))
+    return numpy.minimum(numpy.maximum(shift, lower), upper)
+
+
+def _affineWalk(first, decay, inputs):
+    """
+    Vectorized first order linear recurrence along the last axis of inputs:
+    element 0 is first, every following element is decay * previous + the input at its index
+    @param first: The starting values (array, one per walk)
+    @param decay: How much of the previous value is kept (a number or an array broadcastable to inputs)
+    @param inputs: What is added at every step (array, the input at index 0 is ignored)
+    @return: An array shaped like inputs holding every walk
+    """
+
+    offset = numpy.array(inputs, dtype=float)
+    scale = numpy.array(numpy.broadcast_to(decay, offset.shape), dtype=float)
+    scale[..., 0] = 0  # anchors every prefix to the starting value
+    offset[..., 0] = first
+    return _scanSteps((scale, offset), _composeAffineSteps)[1]
+
+
+
+class PAVChannel:
+    """
+    The spec of one telemetry channel, the generator keeps a registry of these and runs the same generation kernel for each.
+    The channel name is also the key of the channel in the JSON packets.
+
+    @ivar name: The name of the channel (and its JSON key)
+    @ivar minValue: The minimum possible value of the channel
+    @ivar maxValue: The maximum possible value of the channel
+    @ivar nextValueRange: The next value will be within +- nextValueRange of the previous value
+    @ivar decimals: The number of decimals to round to (None uses the generator's NUM_DECIMALS)
+    @ivar distribution: How the next value is drawn, "uniform" or "gaussian"
+    @ivar settings: If set, min, max and range are read from the generator constants MIN_<settings>, MAX_<settings> and NEXT_VALUE_RANGE_<settings> instead
+    """
+
+    DISTRIBUTIONS = ("uniform", "gaussian")
+
+    def __init__(self, name, minValue=0, maxValue=30, nextValueRange=2, decimals=None, distribution="uniform", settings=None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError("unknown distribution %s" % distribution)
+
+        self.name = name
+        self.minValue = minValue
+        self.maxValue = maxValue
+        self.nextValueRange = nextValueRange
+        self.decimals = decimals
+        self.distribution = distribution
+        self.settings = settings
+
+
+
+class PAVModel:
+    """
+    A generation backend of PAVDataGenerator, it decides what the values of a set are.
+    A set must only depend on the generator's seed, settings, channels and setIndex, so any set can be generated on its own
+    (seekPacket, PAVSetPipeline and exportDataset rely on it)
+    """
+
+    def generateSet(self, datagen, setIndex):
+        """
+        Generates set number setIndex of datagen
+        @return: A list holding the values of every channel (a list of PACKETS_PER_SET values each), in channels order
+        """
+
+        raise NotImplementedError
+
+    def generateArray(self, datagen, setIndex):
+        """
+        Generates set number setIndex of datagen as a (len(channels), PACKETS_PER_SET) numpy float array
+        """
+
+        return numpy.array(self.generateSet(datagen, setIndex), dtype=float)
+
+    def streamSet(self, datagen, setIndex):
+        """
+        Returns one iterator per channel over the values of set setIndex, used in STREAMING mode.
+        Models that cannot generate value by value return iterators over the whole generated set
+        """
+
+        return [iter(values) for values in self.generateSet(datagen, setIndex)]
+
+
+class RandomWalkModel(PAVModel):
+    """
+    The default backend: every channel is an independent random walk within +- nextValueRange of the previous value,
+    generated value by value (channelWalk) or, with USE_BATCH_ENGINE, by batchDataGeneration
+    """
+
+    def generateSet(self, datagen, setIndex):
+        if datagen.USE_BATCH_ENGINE:
+            return datagen.batchDataGeneration(setIndex).tolist()
+        return [datagen.channelDataGeneration(channel, datagen.setRandom(setIndex, index)) for index, channel in enumerate(datagen.channels)]
+
+    def streamSet(self, datagen, setIndex):
+        return [datagen.channelWalk(channel, datagen.setRandom(setIndex, index)) for index, channel in enumerate(datagen.channels)]
+
+
+class FlightModel(PAVModel):
+    """
+    A coupled flight state-space model, every set is computed with a few vectorized numpy scans (requires numpy).
+    The pilot moves the throttle and the pitch and banks (clamped random walks), and the rest follows:
+    fan RPM lags behind the throttle, airspeed lags behind the fan and is lost by climbing,
+    altitude climbs with pitch times airspeed, heading turns with the bank and wraps modulo 360,
+    temperature lags behind the fan load and the battery drains every packet, faster the harder the fan runs.
+
+    The state is kept in fractions (0 to 1) of each channel's MIN and MAX, except the heading which is in degrees (0 to 360)
+    whatever MIN_HEADING and MAX_HEADING are. Channels the model does not know (by their settings suffix) are random walks.
+    The stream is continuous from set to set while any set can still be generated on its own: a coarse run of the model
+    with one step per set (boundaries, cached per stream) gives the state at every set boundary, and each set is
+    simulated from its boundary state and bridged to the next one. All rates are per packet.
+
+    @ivar boundaryCache: The boundaries computed so far, per (seedKey, PACKETS_PER_SET)
+
+    @cvar THROTTLE_STEP: The most the throttle moves per packet
+    @cvar FAN_RESPONSE: The part of the gap to the throttle the fan closes per packet
+    @cvar SPEED_RESPONSE: The part of the gap to the fan the airspeed closes per packet
+    @cvar PITCH_STEP: The most the pitch (-1 nose down to 1 nose up) moves per packet
+    @cvar CLIMB_DRAG: The airspeed lost per packet at full pitch up (gained at full pitch down)
+    @cvar CLIMB_RATE: The altitude gained per packet at full pitch and full airspeed
+    @cvar TURN_STEP: The most the turn rate (degrees per packet) changes per packet
+    @cvar MAX_TURN_RATE: The fastest turn (degrees per packet)
+    @cvar BATTERY_IDLE_DRAIN: The battery used per packet with the fan stopped
+    @cvar BATTERY_FAN_DRAIN: The extra battery used per packet at full fan
+    @cvar TEMP_IDLE: The temperature reached with the fan stopped (a full fan heats up to 1)
+    @cvar TEMP_RESPONSE: The part of the gap to the load temperature closed per packet
+    """
+
+    THROTTLE_STEP = 0.02
+    FAN_RESPONSE = 0.05
+    SPEED_RESPONSE = 0.02
+    PITCH_STEP = 0.02
+    CLIMB_DRAG = 0.002
+    CLIMB_RATE = 0.002
+    TURN_STEP = 0.1
+    MAX_TURN_RATE = 3.0
+    BATTERY_IDLE_DRAIN = 0.00002
+    BATTERY_FAN_DRAIN = 0.0001
+    TEMP_IDLE = 0.3
+    TEMP_RESPONSE = 0.01
+
+    def generateSet(self, datagen, setIndex):
+        return self.generateArray(datagen, setIndex).tolist()
+
+    def __init__(self):
+        self.boundaryCache = {}
+
+    def generateArray(self, datagen, setIndex):
+        """
+        Generates set number setIndex of datagen
+        @return: A (len(channels), PACKETS_PER_SET) float array, rows ordered like channels
+        """
+
+        if numpy is None:
+            raise ImportError("numpy is required for the flight model")
+        count = datagen.PACKETS_PER_SET
+        start, end = self.boundaryStates(datagen.seedKey, count, setIndex)
+        rng = numpy.random.default_rng([datagen.seedKey, setIndex])
+        states = self.simulate(rng, count, start, end)
+
+        rows = numpy.empty((len(datagen.channels), count))
+        for index, channel in enumerate(datagen.channels):
+            minValue, maxValue, nextValueRange, decimals = datagen.channelSettings(channel)
+            if channel.settings == "HEADING":
+                rows[index] = states["HEADING"]
+            elif channel.settings in states:
+                rows[index] = minValue + states[channel.settings] * (maxValue - minValue)
+            else:
+                rows[index] = datagen.channelDataGeneration(channel, datagen.setRandom(setIndex, index))
+            rows[index] = numpy.round(rows[index], int(decimals))
+            if channel.settings == "HEADING":
+                rows[index] = numpy.mod(rows[index], 360.0)  # 359.999 rounds to 360
+        return rows
+
+    def boundaryStates(self, seedKey, count, setIndex):
+        """
+        Returns the states (see boundaries) the set setIndex of a stream starts from and the next set starts from.
+        The boundaries of a stream are computed once for the sets up to twice the highest one asked for, and cached
+        @return: A (start, end) tuple of dicts of state name to value
+        """
+
+        key = (seedKey, count)
+        states = self.boundaryCache.get(key)
+        if states is None or len(states["BATTERY"]) < setIndex + 2:
+            if len(self.boundaryCache) >= 16:
+                self.boundaryCache.clear()
+            states = self.boundaries(numpy.random.default_rng([seedKey, count, 0x464c]), count, max(64, 2 * (setIndex + 2)))
+            self.boundaryCache[key] = states
+        return (dict((name, values[setIndex]) for name, values in states.items()),
+                dict((name, values[setIndex + 1]) for name, values in states.items()))
+
+    def boundaries(self, rng, count, sets):
+        """
+        Runs a coarse version of the model with one step per set of count packets, giving the state every set starts from.
+        The pilot inputs take one random step of the size of count packet steps, the lagging states relax towards
+        the inputs averaged over the set, altitude, heading and battery move by count times their average rate.
+        It takes O(sets) vectorized work, and the first sets do not change with sets, so a stream can be extended
+        @param rng: The numpy random Generator of the stream
+        @param sets: The number of sets
+        @return: A dict of THROTTLE, PITCH, TURN and the settings suffixes of simulate to the array of their start values
+        """
+
+        first = rng.uniform(size=4)
+        # one uniform step as wide as the sum of count steps, drawn set by set so more sets only add draws after these
+        draws = rng.uniform(-1.0, 1.0, (sets, 3)).T * math.sqrt(count)
+        throttle = _clampedWalk(0.2 + 0.6 * first[0], draws[0] * self.THROTTLE_STEP, 0.0, 1.0)
+        pitch = _clampedWalk(0.0, draws[1] * self.PITCH_STEP, -1.0, 1.0)
+        turnRate = _clampedWalk(0.0, draws[2] * self.TURN_STEP, -self.MAX_TURN_RATE, self.MAX_TURN_RATE)
+
+        def average(values):
+            # the average over every set, moved to the index of the set after it (index 0 is ignored by the walks)
+            return numpy.concatenate(([0.0], (values[:-1] + values[1:]) / 2.0))
+
+        decay = (1.0 - self.FAN_RESPONSE) ** count
+        fan = _affineWalk(throttle[0], decay, (1.0 - decay) * average(throttle))
+        decay = (1.0 - self.SPEED_RESPONSE) ** count
+        airspeed = _affineWalk(fan[0], decay, (1.0 - decay) * (average(fan) - self.CLIMB_DRAG / self.SPEED_RESPONSE * average(pitch)))
+        airspeed = numpy.clip(airspeed, 0.0, 1.0)
+        altitude = _clampedWalk(0.2 + 0.6 * first[1], count * self.CLIMB_RATE * average(pitch) * average(airspeed), 0.0, 1.0)
+        heading = numpy.mod(360.0 * first[2] + numpy.cumsum(count * average(turnRate)), 360.0)
+
+        load = self.TEMP_IDLE + (1.0 - self.TEMP_IDLE) * fan
+        decay = (1.0 - self.TEMP_RESPONSE) ** count
+        temperature = _affineWalk(load[0], decay, (1.0 - decay) * average(load))
+        drain = count * (self.BATTERY_IDLE_DRAIN + self.BATTERY_FAN_DRAIN * average(fan))
+        battery = numpy.maximum(0.6 + 0.4 * first[3] - numpy.cumsum(drain), 0.0)
+
+        return {
+            "THROTTLE": throttle,
+            "PITCH": pitch,
+            "TURN": turnRate,
+            "BATTERY": battery,
+            "ALTITUDE": altitude,
+            "HEADING": heading,
+            "AIRSPEED": airspeed,
+            "TEMP": temperature,
+            "FAN": fan,
+            }
+
+    def simulate(self, rng, count, start=None, end=None):
+        """
+        Runs the model for count packets
+        @param rng: The numpy random Generator to draw from
+        @param start: The state to start from, a dict like the values of boundaries (default a random one)
+        @param end: if given, the state the packet after the last one must have (the start of the next set):
+        the run is bridged to it by spreading the difference over the packets, and the battery drain is scaled to it
+        @return: A dict of settings suffix (BATTERY, ALTITUDE, HEADING, AIRSPEED, TEMP, FAN) to the array of its values
+        """
+
+        if start is None:
+            start = dict((name, values[0]) for name, values in self.boundaries(rng, count, 1).items())
+        steps = count + 1  # and the first packet of the next set, which end pins
+        ramp = numpy.arange(steps) / float(count)
+
+        def bridge(values, name, lower, upper):
+            if end is None:
+                return values
+            return numpy.clip(values + (end[name] - values[-1]) * ramp, lower, upper)
+
+        throttle = bridge(_clampedWalk(start["THROTTLE"], rng.uniform(-1.0, 1.0, steps) * self.THROTTLE_STEP, 0.0, 1.0), "THROTTLE", 0.0, 1.0)
+        fan = bridge(_affineWalk(start["FAN"], 1.0 - self.FAN_RESPONSE, self.FAN_RESPONSE * throttle), "FAN", 0.0, 1.0)
+
+        pitch = bridge(_clampedWalk(start["PITCH"], rng.uniform(-1.0, 1.0, steps) * self.PITCH_STEP, -1.0, 1.0), "PITCH", -1.0, 1.0)
+        airspeed = _affineWalk(start["AIRSPEED"], 1.0 - self.SPEED_RESPONSE, self.SPEED_RESPONSE * fan - self.CLIMB_DRAG * pitch)
+        airspeed = bridge(numpy.clip(airspeed, 0.0, 1.0), "AIRSPEED", 0.0, 1.0)
+        altitude = bridge(_clampedWalk(start["ALTITUDE"], self.CLIMB_RATE * pitch * airspeed, 0.0, 1.0), "ALTITUDE", 0.0, 1.0)
+
+        turnRate = _clampedWalk(start["TURN"], rng.uniform(-1.0, 1.0, steps) * self.TURN_STEP, -self.MAX_TURN_RATE, self.MAX_TURN_RATE)
+        turnRate = bridge(turnRate, "TURN", -self.MAX_TURN_RATE, self.MAX_TURN_RATE)
+        turns = turnRate[1:]
+        if end is not None:
+            # the heading is bridged by changing the turns in proportion to their room below MAX_TURN_RATE, the shorter way
+            # round when there is room for it and the other way otherwise (there always is for sets of 60 packets or more)
+            missing = numpy.mod(end["HEADING"] - start["HEADING"] - turns.sum() + 180.0, 360.0) - 180.0
+            for turn in (missing, missing - math.copysign(360.0, missing)):
+                room = self.MAX_TURN_RATE - math.copysign(1.0, turn) * turns
+                if room.sum() >= abs(turn):
+                    turns = turns + turn * room / room.sum()
+                    break
+            else:
+                turns = turns + missing / count
+        heading = numpy.mod(start["HEADING"] + numpy.concatenate(([0.0], numpy.cumsum(turns))), 360.0)
+
+        load = self.TEMP_IDLE + (1.0 - self.TEMP_IDLE) * fan
+        temperature = bridge(_affineWalk(start["TEMP"], 1.0 - self.TEMP_RESPONSE, self.TEMP_RESPONSE * load), "TEMP", 0.0, 1.0)
+
+        drain = self.BATTERY_IDLE_DRAIN + self.BATTERY_FAN_DRAIN * fan[1:]
+        if end is not None:
+            drain = drain * ((start["BATTERY"] - end["BATTERY"]) / drain.sum())
+        battery = numpy.maximum(start["BATTERY"] - numpy.concatenate(([0.0], numpy.cumsum(drain))), 0.0)
+
+        states = {
+            "BATTERY": battery,
+            "ALTITUDE": altitude,
+            "HEADING": heading,
+            "AIRSPEED": airspeed,
+            "TEMP": temperature,
+            "FAN": fan,
+            }
+        return dict((name, values[:count]) for name, values in states.items())
 
 
 
@@ -29,11 +430,15 @@ class PAVDataGenerator:
 
     
    
-    @group Settings: PACKETS_PER_SET, NUM_DECIMALS, MIN_AIRSPEED, MAX_AIRSPEED, NEXT_VALUE_RANGE_AIRSPEED, MIN_FAN, MAX_FAN, NEXT_VALUE_RANGE_FAN, MIN_TEMP, MAX_TEMP, NEXT_VALUE_RANGE_TEMP, MIN_HEADING, MAX_HEADING, NEXT_VALUE_RANGE_HEADING, MIN_ALTITUDE, MAX_ALTITUDE, NEXT_VALUE_RANGE_ALTITUDE, MIN_BATTERY, MAX_BATTERY, NEXT_VALUE_RANGE_BATTERY  
+    @group Settings: PACKETS_PER_SET, NUM_DECIMALS, USE_BATCH_ENGINE, STREAMING, CHANNELS, MIN_AIRSPEED, MAX_AIRSPEED, NEXT_VALUE_RANGE_AIRSPEED, MIN_FAN, MAX_FAN, NEXT_VALUE_RANGE_FAN, MIN_TEMP, MAX_TEMP, NEXT_VALUE_RANGE_TEMP, MIN_HEADING, MAX_HEADING, NEXT_VALUE_RANGE_HEADING, MIN_ALTITUDE, MAX_ALTITUDE, NEXT_VALUE_RANGE_ALTITUDE, MIN_BATTERY, MAX_BATTERY, NEXT_VALUE_RANGE_BATTERY  
     @cvar : Settings 
     @cvar MIN_AIRSPEED: The minimum possible airspeed value for the generator to use
     @cvar MAX_AIRSPEED: The maximum possible airspeed value for the generator to use
     @cvar NUM_DECIMALS: The number of decimals to round 2
+    @cvar USE_BATCH_ENGINE: if True, new sets are built by batchDataGeneration (requires numpy) instead of the six per-value generators
+    @cvar STREAMING: if True, every channel advances one value per packet (channelWalk) instead of generating whole sets,
+    the packets are the same as in set mode without the batch engine but there is no stall when a set runs out
+    @cvar CHANNELS: The default channel registry (a list of PAVChannel), each generator starts with a copy of it
     @cvar NEXT_VALUE_RANGE_AIRSPEED: For all values after the first one the next airspeed value will be within +- NEXT_VALUE_RANGE_AIRSPEED of the previous value
     @cvar PACKETS_PER_SET: The number of packets generated before the generator starts fresh
     @cvar MIN_FAN: The minimum possible fan rpm, value for the generator to use
@@ -54,15 +459,20 @@ class PAVDataGenerator:
 
 
 
-    @group Storage: setCount, packetNumber, batteryLevel, altitudeLevel, headingDirection, airspeedLevel, temperatureLevel, fanRPM
+    @group Storage: seed, model, setIndex, setCount, packetNumber, setsGenerated, channels, channelData, channelStreams, settingsVersion, origins
+    @ivar seed: The seed of the data stream, keep it to generate the same packets again
+    @ivar model: The PAVModel generating the sets (RandomWalkModel unless another model is given)
+    @ivar setIndex: The number of the current set (counting from 0, -1 before the first set)
+    @ivar setsGenerated: The number of times a set was generated (or started, in STREAMING mode), seeks included
     @ivar setCount: The current packet to be sent in the generated set
     @ivar packetNumber: The number of packets sent in total (accross all generated sets)
-    @ivar batteryLevel: The current set of battery data
-    @ivar altitudeLevel: The current set of altitude data
-    @ivar headingDirection: The curret set of heading data
-    @ivar airspeedLevel: The current set of airspeed data
-    @ivar temperatureLevel: The current set of temprature data
-    @ivar fanRPM: The current set of fan data
+    @ivar channels: The channel registry of this generator (a list of PAVChannel), add to it with addChannel
+    @ivar channelData: The current set of data of every channel, in channels order. The built-in channels can also be read
+    (read only) through batteryLevel, altitudeLevel, headingDirection, airspeedLevel, temperatureLevel and fanRPM
+    @ivar channelStreams: In STREAMING mode, the channelWalk of every channel in the current set, in channels order
+    @ivar settingsVersion: The PAVConfig version of the settings applied with applySettings (0 for none)
+    @ivar origins: Where the settings changed, one (packet number before it, first set index, the settingsVersion and the dict of
+    settings in force before it) per applySettings, oldest first. The first one is the start of the stream
 
     @sort: Settings, Storage
     
@@ -72,6 +482,8 @@ class PAVDataGenerator:
     #Constants (set these)
     PACKETS_PER_SET = 500
     NUM_DECIMALS = 2
+    USE_BATCH_ENGINE = False
+    STREAMING = False
 
     MIN_AIRSPEED = 0  
     MAX_AIRSPEED = 30
@@ -96,94 +508,261 @@ class PAVDataGenerator:
     MIN_BATTERY = 0  
     MAX_BATTERY = 30
     NEXT_VALUE_RANGE_BATTERY = 2
+
+    CHANNELS = [
+        PAVChannel("batteryData", settings="BATTERY"),
+        PAVChannel("altitudeData", settings="ALTITUDE"),
+        PAVChannel("headingData", settings="HEADING"),
+        PAVChannel("speedData", settings="AIRSPEED"),
+        PAVChannel("tempData", settings="TEMP"),
+        PAVChannel("fanData", settings="FAN"),
+        ]
     
     
     
-    def __init__(self):
+    def __init__(self, seed=None, model=None):
+        """
+        @param seed: The seed (an int or a string) of the data stream, the same seed always generates the same packets.
+        A random seed is picked (and kept in seed) when none is given
+        @param model: The PAVModel generating the sets, for example FlightModel() (default RandomWalkModel())
+        """
+
         #Variables/Storage (leave these alone)
         self.setCount = 0
         self.packetNumber = 0
-        self.batteryLevel = []
-        self.altitudeLevel = []
-        self.headingDirection = ""
-        self.airspeedLevel = []
-        self.temperatureLevel = []
-        self.fanRPM = []
+        self.setIndex = -1
+        self.setsGenerated = 0
+        self.seed = random.SystemRandom().getrandbits(64) if seed is None else seed
+        self.seedKey = int(hashlib.sha256(str(self.seed).encode("utf-8")).hexdigest()[:16], 16)
+        self.random = random.Random("%s" % (self.seed,))
+        self.numpyRandom = None
+        self.model = RandomWalkModel() if model is None else model
+        self.channels = list(self.CHANNELS)
+        self.channelData = []
+        self.channelStreams = []
+        self.settingsVersion = 0
+        self.origins = [(0, 0, None, None)]
 
     
     
 
-    def batteryDataGeneration(self):
+    def addChannel(self, channel):
         """
-        Returns a a set of random set of battery data, using previous values to generate next ones
+        Adds a channel to this generator, the current set is generated again so it includes the channel
+        @param channel: The PAVChannel to add, its name must not already be in use
         """
 
-        batteryData = []  # Set to be returned
-        firstVal = random.uniform(self.MIN_BATTERY, self.MAX_BATTERY)
-        batteryData.append(round(firstVal, self.NUM_DECIMALS))
-        lowerVal = firstVal - self.NEXT_VALUE_RANGE_BATTERY
-        upperVal = firstVal + self.NEXT_VALUE_RANGE_BATTERY
-        
-        while len(batteryData) < self.PACKETS_PER_SET:
-            val = random.uniform(lowerVal, upperVal)
-            batteryData.append(round(val, self.NUM_DECIMALS))
+        if channel.name in [existing.name for existing in self.channels]:
+            raise ValueError("channel %s already exists" % channel.name)
+        self.channels.append(channel)
+        if self.setCount > 0:
+            self.__loadSet()
 
-            upperVal = val + self.NEXT_VALUE_RANGE_BATTERY
-            lowerVal = val - self.NEXT_VALUE_RANGE_BATTERY
-            if upperVal > self.MAX_BATTERY:
-                upperVal = self.MAX_BATTERY
-            if lowerVal < self.MIN_BATTERY:
-                lowerVal = self.MIN_BATTERY
+    def setRandom(self, setIndex, channelIndex):
+        """
+        Returns the random number generator of one channel in one set.
+        It is seeded from seed, setIndex and channelIndex only, so any set can be generated again without the sets before it
+        """
 
-        return batteryData
+        return random.Random("%s:%d:%d" % (self.seed, setIndex, channelIndex))
 
-    def altitudeDataGeneration(self):
+    def snapshot(self):
         """
-        Returns a a set of random altitudes, using previous values to generate next ones
+        Returns a new generator of the same stream (seed, model, channels and settings) at its start.
+        Unlike the generator itself it holds no running state, so it can be pickled (sent to worker processes) at any time
         """
-        
-        altitudeData = []  # Set to be returned
-        firstVal = random.uniform(self.MIN_ALTITUDE, self.MAX_ALTITUDE)
-        altitudeData.append(round(firstVal, self.NUM_DECIMALS))
-        lowerVal = firstVal - self.NEXT_VALUE_RANGE_ALTITUDE
-        upperVal = firstVal + self.NEXT_VALUE_RANGE_ALTITUDE
-        
-        while len(altitudeData) < self.PACKETS_PER_SET:
-            val = random.uniform(lowerVal, upperVal)
-            altitudeData.append(round(val, self.NUM_DECIMALS))
 
-            upperVal = val + self.NEXT_VALUE_RANGE_ALTITUDE
-            lowerVal = val - self.NEXT_VALUE_RANGE_ALTITUDE
-            if upperVal > self.MAX_ALTITUDE:
-                upperVal = self.MAX_ALTITUDE
-            if lowerVal < self.MIN_ALTITUDE:
-                lowerVal = self.MIN_ALTITUDE
+        snapshot = PAVDataGenerator(self.seed, self.model)
+        snapshot.channels = list(self.channels)
+        for name, value in vars(self).items():
+            if name.isupper():
+                setattr(snapshot, name, value)
+        return snapshot
+
+    def generateSet(self, setIndex):
+        """
+        Generates set number setIndex (counting from 0) of this generator's stream.
+        The same seed and setIndex always give the same set, with either engine, the values come from the model
+        @return: A list holding the set of data of every channel, in channels order
+        """
 
-        return altitudeData
+        return self.model.generateSet(self, setIndex)
 
-    def headingDataGeneration(self):
+    def seekPacket(self, packetNumber):
         """
-        Returns a a set of random headings in degree's, using previous values to generate next ones
+        Moves the stream so the next PAVDataCollection call returns packet packetNumber.
+        Only the set holding that packet is generated, the sets before it are skipped. Settings changed with applySettings
+        are taken into account (PACKETS_PER_SET must not have been changed otherwise): the set is counted from the origin
+        of the settings in force at that packet, and moving back before an origin restores the settings from before it
+        @param packetNumber: The packet number to continue from (the first packet is 1)
+        """
+
+        if packetNumber < 1:
+            raise ValueError("packet numbers start at 1")
+        index = len(self.origins) - 1
+        while self.origins[index][0] >= packetNumber:
+            index = index - 1
+        originPacketNumber, originSetIndex = self.origins[index][:2]
+        if index < len(self.origins) - 1:
+            version, settings = self.origins[index + 1][2:]
+            for name in [name for name in vars(self) if name.isupper()]:
+                delattr(self, name)
+            for name, value in settings.items():
+                setattr(self, name, value)
+            self.settingsVersion = version
+            del self.origins[index + 1:]
+        setIndex, offset = divmod(packetNumber - 1 - originPacketNumber, self.PACKETS_PER_SET)
+        setIndex = setIndex + originSetIndex
+        self.packetNumber = packetNumber - 1
+        self.setCount = offset
+        if offset == 0:
+            # the set is generated by the next PAVDataCollection call, as with a fresh generator
+            self.setIndex = setIndex - 1
+            self.channelData = []
+            self.channelStreams = []
+        else:
+            self.setIndex = setIndex
+            self.__loadSet()
+
+    def __loadSet(self):
+        """
+        Prepares set setIndex for the packets from setCount on: the whole set is generated,
+        or in STREAMING mode one stream per channel is started (see PAVModel.streamSet) and moved past the first setCount values
+        """
+
+        self.setsGenerated = self.setsGenerated + 1
+        if self.STREAMING:
+            self.channelData = []
+            self.channelStreams = self.model.streamSet(self, self.setIndex)
+            for stream in self.channelStreams:
+                next(itertools.islice(stream, self.setCount, self.setCount), None)
+        else:
+            self.channelData = self.generateSet(self.setIndex)
+            self.channelStreams = []
+
+    def isAtSetBoundary(self):
+        """
+        Returns True when the next PAVDataCollection call starts a new set
+        """
+
+        return self.setCount >= self.PACKETS_PER_SET or self.setCount == 0
+
+    def applySettings(self, settings, version=None):
+        """
+        Sets the settings (constants such as MAX_AIRSPEED or PACKETS_PER_SET) on this generator only, see PAVConfig.
+        Call it at a set boundary (isAtSetBoundary), the next packet then starts a new set made with the new settings.
+        The packet and set numbers the settings start from are kept in origins, for seekPacket
+        @param settings: A dict of setting name to value, lowercase names (broadcast settings) are ignored
+        @param version: The PAVConfig version of settings, kept in settingsVersion (default unchanged)
+        """
+
+        if self.origins[-1][0] != self.packetNumber:
+            # packets were made with the settings in force, keep them to move back to
+            previous = dict((name, value) for name, value in vars(self).items() if name.isupper())
+            self.origins.append((self.packetNumber, self.setIndex + 1, self.settingsVersion, previous))
+        for name, value in settings.items():
+            if name.isupper():
+                setattr(self, name, value)
+        self.setCount = 0
+        if version is not None:
+            self.settingsVersion = version
+
+    def channel(self, name):
+        """
+        Returns the registered PAVChannel called name
+        """
+
+        for channel in self.channels:
+            if channel.name == name:
+                return channel
+        raise KeyError(name)
+
+    def __channelSet(self, name):
+        """
+        Returns the current set of the channel called name, empty before the first set and in STREAMING mode
+        """
+
+        if not self.channelData:
+            return []
+        return self.channelData[[channel.name for channel in self.channels].index(name)]
+
+    batteryLevel = property(lambda self: self.__channelSet("batteryData"), doc="The current set of battery data")
+    altitudeLevel = property(lambda self: self.__channelSet("altitudeData"), doc="The current set of altitude data")
+    headingDirection = property(lambda self: self.__channelSet("headingData"), doc="The current set of heading data")
+    airspeedLevel = property(lambda self: self.__channelSet("speedData"), doc="The current set of airspeed data")
+    temperatureLevel = property(lambda self: self.__channelSet("tempData"), doc="The current set of temperature data")
+    fanRPM = property(lambda self: self.__channelSet("fanData"), doc="The current set of fan data")
+
+    def channelSettings(self, channel):
+        """
+        Resolves the generation settings of a channel.
+        Channels linked to a settings suffix read MIN_<suffix>, MAX_<suffix> and NEXT_VALUE_RANGE_<suffix> from this generator
+        @return: A tuple (minValue, maxValue, nextValueRange, decimals)
+        """
+
+        if channel.settings is None:
+            minValue, maxValue, nextValueRange = channel.minValue, channel.maxValue, channel.nextValueRange
+        else:
+            minValue = getattr(self, "MIN_" + channel.settings)
+            maxValue = getattr(self, "MAX_" + channel.settings)
+            nextValueRange = getattr(self, "NEXT_VALUE_RANGE_" + channel.settings)
+        decimals = self.NUM_DECIMALS if channel.decimals is None else channel.decimals
+        return minValue, maxValue, nextValueRange, decimals
+
+    def channelDataGeneration(self, channel, rng=None):
+        """
+        Returns a set of random data for any channel, using previous values to generate next ones.
+        Every value is within +- nextValueRange of the previous one and is never outside of minValue and maxValue
+        @param channel: The PAVChannel to generate
+        @param rng: The random.Random to draw from (default this generator's own seeded stream)
+        """
+
+        return list(self.channelWalk(channel, rng))
+
+    def channelWalk(self, channel, rng=None):
+        """
+        Yields the set of one channel value by value (PACKETS_PER_SET values), the kernel behind channelDataGeneration.
+        Only the previous value is kept, so streaming a set takes the same memory whatever its size
+        @param channel: The PAVChannel to generate
+        @param rng: The random.Random to draw from (default this generator's own seeded stream)
+        """
+
+        minValue, maxValue, nextValueRange, decimals = self.channelSettings(channel)
+        gaussian = channel.distribution == "gaussian"
+        rng = self.random if rng is None else rng
+
+        val = rng.uniform(minValue, maxValue)
+        yield round(val, decimals)
+
+        for x in range(self.PACKETS_PER_SET - 1):
+            lowerVal = max(val - nextValueRange, minValue)
+            upperVal = min(val + nextValueRange, maxValue)
+            if gaussian:
+                val = min(max(rng.gauss(val, nextValueRange / 2.0), lowerVal), upperVal)
+            else:
+                val = rng.uniform(lowerVal, upperVal)
+            yield round(val, decimals)
+
+    def batteryDataGeneration(self):
+        """
+        Returns a a set of random set of battery data, using previous values to generate next ones
         """
 
-        headingData = []  # Set to be returned
-        firstVal = random.uniform(self.MIN_HEADING, self.MAX_HEADING)
-        headingData.append(round(firstVal, self.NUM_DECIMALS))
-        lowerVal = firstVal - self.NEXT_VALUE_RANGE_HEADING
-        upperVal = firstVal + self.NEXT_VALUE_RANGE_HEADING
+        return self.channelDataGeneration(self.channel("batteryData"))
+
+    def altitudeDataGeneration(self):
+        """
+        Returns a a set of random altitudes, using previous values to generate next ones
+        """
         
-        while len(headingData) < self.PACKETS_PER_SET:
-            val = random.uniform(lowerVal, upperVal)
-            headingData.append(round(val, self.NUM_DECIMALS))
+        return self.channelDataGeneration(self.channel("altitudeData"))
 
-            upperVal = val + self.NEXT_VALUE_RANGE_HEADING
-            lowerVal = val - self.NEXT_VALUE_RANGE_HEADING
-            if upperVal > self.MAX_HEADING:
-                upperVal = self.MAX_HEADING
-            if lowerVal < self.MIN_HEADING:
-                lowerVal = self.MIN_HEADING
+    def headingDataGeneration(self):
+        """
+        Returns a a set of random headings in degree's, using previous values to generate next ones
+        """
 
-        return headingData
+        return self.channelDataGeneration(self.channel("headingData"))
 
 
     def temperatureDataGeneration(self):
@@ -191,24 +770,7 @@ class PAVDataGenerator:
         Returns a a set of temperature, using previous values to generate next ones
         """
         
-        tempData = []  # Set to be returned
-        firstVal = random.uniform(self.MIN_TEMP, self.MAX_TEMP)
-        tempData.append(round(firstVal, self.NUM_DECIMALS))
-        lowerVal = firstVal - self.NEXT_VALUE_RANGE_TEMP
-        upperVal = firstVal + self.NEXT_VALUE_RANGE_TEMP
-        
-        while len(tempData) < self.PACKETS_PER_SET:
-            val = random.uniform(lowerVal, upperVal)
-            tempData.append(round(val, self.NUM_DECIMALS))
-
-            upperVal = val + self.NEXT_VALUE_RANGE_TEMP
-            lowerVal = val - self.NEXT_VALUE_RANGE_TEMP
-            if upperVal > self.MAX_TEMP:
-                upperVal = self.MAX_TEMP
-            if lowerVal < self.MIN_TEMP:
-                lowerVal = self.MIN_TEMP
-
-        return tempData
+        return self.channelDataGeneration(self.channel("tempData"))
 
 
     def fanRPMDataGeneration(self):
@@ -216,24 +778,7 @@ class PAVDataGenerator:
         Returns a a set of fan, using previous values to generate next ones
         """
         
-        fanData = []  # Set to be returned
-        firstVal = random.uniform(self.MIN_FAN, self.MAX_FAN)
-        fanData.append(round(firstVal, self.NUM_DECIMALS))
-        lowerVal = firstVal - self.NEXT_VALUE_RANGE_FAN
-        upperVal = firstVal + self.NEXT_VALUE_RANGE_FAN
-        
-        while len(fanData) < self.PACKETS_PER_SET:
-            val = random.uniform(lowerVal, upperVal)
-            fanData.append(round(val, self.NUM_DECIMALS))
-
-            upperVal = val + self.NEXT_VALUE_RANGE_FAN
-            lowerVal = val - self.NEXT_VALUE_RANGE_FAN
-            if upperVal > self.MAX_FAN:
-                upperVal = self.MAX_FAN
-            if lowerVal < self.MIN_FAN:
-                lowerVal = self.MIN_FAN
-
-        return fanData
+        return self.channelDataGeneration(self.channel("fanData"))
 
 
                 
@@ -242,58 +787,67 @@ class PAVDataGenerator:
         Returns a a set of random airspeed data, using previous values to generate next ones
         """
         
-        speedData = []  # Set to be returned
-        firstVal = random.uniform(self.MIN_AIRSPEED, self.MAX_AIRSPEED)
-        speedData.append(round(firstVal, self.NUM_DECIMALS))
-        lowerVal = firstVal - self.NEXT_VALUE_RANGE_AIRSPEED
-        upperVal = firstVal + self.NEXT_VALUE_RANGE_AIRSPEED
-        
-        while len(speedData) < self.PACKETS_PER_SET:
-            val = random.uniform(lowerVal, upperVal)
-            speedData.append(round(val, self.NUM_DECIMALS))
+        return self.channelDataGeneration(self.channel("speedData"))
+
+
+    def batchDataGeneration(self, setIndex=None):
+        """
+        Returns every channel for a whole set at once, generated with numpy in a single vectorized pass.
+        Each row follows the same rules as channelDataGeneration: it starts anywhere between MIN and MAX,
+        moves at most NEXT_VALUE_RANGE per packet, is clamped to MIN and MAX and is rounded to its decimals
+        @param setIndex: if given, the set is drawn from a generator seeded from seed and setIndex only (see generateSet),
+        otherwise from this generator's own seeded numpy stream
+        @return: A (len(channels), PACKETS_PER_SET) float array, rows ordered like channels
+        """
+
+        if numpy is None:
+            raise ImportError("numpy is required for the batch engine")
+        if setIndex is not None:
+            rng = numpy.random.default_rng([self.seedKey, setIndex])
+        else:
+            if self.numpyRandom is None:
+                self.numpyRandom = numpy.random.default_rng(self.seedKey)
+            rng = self.numpyRandom
+
+        settings = numpy.array([self.channelSettings(channel) for channel in self.channels], dtype=float)
+        lower, upper, stepRange, decimals = settings.T
+        gaussian = numpy.array([channel.distribution == "gaussian" for channel in self.channels])
 
-            upperVal = val + self.NEXT_VALUE_RANGE_AIRSPEED
-            lowerVal = val - self.NEXT_VALUE_RANGE_AIRSPEED
-            if upperVal > self.MAX_AIRSPEED:
-                upperVal = self.MAX_AIRSPEED
-            if lowerVal < self.MIN_AIRSPEED:
-                lowerVal = self.MIN_AIRSPEED
+        first = rng.uniform(lower, upper)
+        steps = rng.uniform(-1.0, 1.0, (len(self.channels), self.PACKETS_PER_SET))
+        if gaussian.any():
+            steps[gaussian] = numpy.clip(rng.normal(0.0, 0.5, steps[gaussian].shape), -1.0, 1.0)
+        walks = _clampedWalk(first, steps * stepRange[:, None], lower, upper)
 
-        return speedData
+        for places in numpy.unique(decimals):
+            rows = decimals == places
+            walks[rows] = numpy.round(walks[rows], int(places))
+        return walks
 
     
 
     def PAVDataCollection(self):
         """
         This function will be used to send the data generated to a json conversion function
-        Collects a lists of each generated data type and sends them to the json converter
+        Collects the generated data of every channel and sends them to the json converter
         If it runs out of packets to send (specified by PACKETS_PER_set),
         it requests a new set from the data generator.
+        @return: A list holding one value per channel (in channels order) followed by the packet number
         """
         
         
-        if self.setCount >= self.PACKETS_PER_SET or self.setCount == 0:
+        if self.isAtSetBoundary():
             
-                
-            self.batteryLevel = self.batteryDataGeneration()
-            self.altitudeLevel = self.altitudeDataGeneration()
-            self.headingDirection = self.headingDataGeneration()
-            self.airspeedLevel = self.airspeedDataGeneration()
-            self.temperatureLevel = self.temperatureDataGeneration()
-            self.fanRPM = self.fanRPMDataGeneration()
-            if self.setCount >= self.PACKETS_PER_SET:
-                self.setCount = 0
+            self.setIndex = self.setIndex + 1
+            self.setCount = 0
+            self.__loadSet()
 
         self.packetNumber = self.packetNumber + 1
-        dataPacket = [
-            self.batteryLevel[self.setCount],
-            self.altitudeLevel[self.setCount],
-            self.headingDirection[self.setCount],
-            self.airspeedLevel[self.setCount],
-            self.temperatureLevel[self.setCount],
-            self.fanRPM[self.setCount],
-            self.packetNumber,
-            ]
+        if self.STREAMING:
+            dataPacket = [next(stream) for stream in self.channelStreams]
+        else:
+            dataPacket = [data[self.setCount] for data in self.channelData]
+        dataPacket.append(self.packetNumber)
         self.setCount = self.setCount + 1
 
         return dataPacket
@@ -301,135 +855,2923 @@ class PAVDataGenerator:
             
 
 
-class GenerateAndBroadcast:
-
-
+class LatencyHistogram:
     """
-    Use an instance of this class to invoke the PAV Data Generator.
-    Data packs will start being continiously both on construction (calls sendUDP()) or when startUDP() is called
-    data packets will contine to be send until stopUDP() is called.
-    
-    
-    @ivar isPrinting: if True, packets are printed to the python console.
+    Histogram of durations with power of two buckets, recording is O(1) and the memory is constant.
+    Bucket 0 holds durations below resolution, bucket n those from resolution * 2^(n-1) up to resolution * 2^n,
+    so percentiles are exact to within a factor of two (and never above the largest duration recorded)
+
+    @ivar resolution: The upper bound of the first bucket (seconds)
+    @ivar buckets: The number of durations in each bucket
+    @ivar count: The number of durations recorded
+    @ivar total: The sum of the durations recorded (seconds)
+    @ivar maximum: The largest duration recorded (seconds)
     """
 
-    isPrinting = False;
+    def __init__(self, resolution=1e-6):
+        self.resolution = resolution
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
 
-    def __init__(self, hololens_ip, hololens_port, delay):
-        """
-        This is the constructor
-        @param hololens_ip: The ip of the hololens (s string)
-        @param hololens_port: the port the hololens is listening on (as int)
-        @param delay: The amount of time (sleep) between each packet
-        """
-        
-        self.ip = hololens_ip
-        self.port = hololens_port
-        self.datagen = PAVDataGenerator()
-        #constants can be set at the top of PAVDataGenerator Class
-        self.waitTime = delay
-        self.generationKiller = threading.Event()
-        self.isFirstStart = True;
-        
-    def jsonDefault(self, object):
+    def record(self, seconds):
         """
-        needed for json generation
+        Adds one duration (seconds) to the histogram
         """
 
-        return object.__dict__
-
+        index = min(int(seconds / self.resolution).bit_length(), 63)
+        self.buckets[index] = self.buckets[index] + 1
+        self.count = self.count + 1
+        self.total = self.total + seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
 
-    def jsonConversion(self, PAVGeneratedData):
+    def percentile(self, percent):
         """
-        Gets a packet from the data generator
-        Puts each generated packet into an instance the struct tyoe.
-        The struct containing the data is converted to a string using JSON
-        This generated string is what is sent over UDP
+        Returns the duration (seconds) that percent of the recorded durations do not exceed
         """
-        
-        dataPacket = self.PAVDataStructure(
-            PAVGeneratedData[0], # battery
-            PAVGeneratedData[1], # altitude
-            PAVGeneratedData[2], # heading
-            PAVGeneratedData[3], # airspeed 
-            PAVGeneratedData[4], # temp
-            PAVGeneratedData[5], # fan
-            PAVGeneratedData[6], # packet number
-            )
-        jsonPAVDataStructure = json.dumps(dataPacket, default=self.jsonDefault)
-        return str(jsonPAVDataStructure)
 
+        if self.count == 0:
+            return 0.0
+        wanted = self.count * percent / 100.0
+        seen = 0
+        for index, bucketCount in enumerate(self.buckets):
+            seen = seen + bucketCount
+            if seen >= wanted and bucketCount:
+                return min(self.resolution * 2 ** index, self.maximum)
+        return self.maximum
 
-    def __startThread(self, generationKiller, udp_ip, udp_port):
+    def summary(self):
         """
-        Sends the JSON generated string to the hololens via UDP continiously until stop udp is called
-        @param udp_ip: The IP of the Hololens to send data to
-        @param udp_port: The used to connect to the hololens
+        Returns the count, mean, maximum and the 50th, 90th, 99th and 99.9th percentiles (seconds) as a dict
         """
 
-        while not generationKiller.wait(self.waitTime):
-            data = self.datagen.PAVDataCollection() #Get your data from sensors or whereever
-            packet = self.jsonConversion(data) #convert struct instance to string with json
-            if self.isPrinting:
-                print(packet)
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # UDP
-            sock.sendto(packet, (udp_ip, udp_port))
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.maximum,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            }
+
+
+
+class PAVStats:
+    """
+    Counters and per stage timings of a broadcast, written by the send thread and read by stats() at any time.
+    Counters are updated for every packet but only every sampleEvery-th packet is timed,
+    so the instrumentation costs a few integer additions per packet
+
+    @cvar STAGES: The timed stages, generate (PAVDataCollection), encode (codec) and send (UDPSender.send)
+    @ivar sampleEvery: Every how many packets the stages are timed (1 times every packet)
+    @ivar packetsSent: The number of packets handed to the sender
+    @ivar bytesSent: The number of bytes handed to the sender
+    @ivar sendErrors: The number of packets the sender raised an OSError for (they are dropped)
+    @ivar packetsCoalesced: The number of packets skipped to catch up (see GenerateAndBroadcast coalesce)
+    @ivar stages: A LatencyHistogram per stage name
+    @ivar runTime: The seconds spent broadcasting by the runs that have stopped
+    @ivar startTime: The perf_counter time the running broadcast started, None when stopped
+    """
+
+    STAGES = ("generate", "encode", "send")
+
+    def __init__(self, sampleEvery=16):
+        self.sampleEvery = sampleEvery
+        self.packetsSent = 0
+        self.bytesSent = 0
+        self.sendErrors = 0
+        self.packetsCoalesced = 0
+        self.stages = dict((stage, LatencyHistogram()) for stage in self.STAGES)
+        self.runTime = 0.0
+        self.startTime = None
 
     def start(self):
         """
-        use to start sending packets (on its own thread)
+        Marks the start of a run, the achieved rate only counts the time spent running
         """
-        if not self.isFirstStart:
-            self.stop()
-        else:
-            self.isFirstStart = False
-        self.generationThread = threading.Thread(target=self.__startThread, args=(self.generationKiller, self.ip, self.port))
-        self.generationThread.start()
-        print("Data Generation and Broadcast started!")
-        
+
+        self.startTime = time.perf_counter()
+
     def stop(self):
         """
-        Stop generation and end the generation thread
+        Marks the end of a run
         """
-        self.generationKiller.set()
-        self.generationThread.join()
-        self.generationKiller = threading.Event()
-        print("Data Generation and Broadcast stopped!")
-        
 
-    def resetPacketNumber(self):
+        if self.startTime is not None:
+            self.runTime = self.runTime + time.perf_counter() - self.startTime
+            self.startTime = None
+
+    def isSampled(self):
+        """
+        Returns True when the packet about to be sent should be timed
+        """
+
+        return (self.packetsSent + self.sendErrors) % self.sampleEvery == 0
+
+    def elapsed(self):
+        """
+        Returns the seconds spent broadcasting, the running broadcast included
+        """
+
+        if self.startTime is None:
+            return self.runTime
+        return self.runTime + time.perf_counter() - self.startTime
+
+    def snapshot(self):
+        """
+        Returns the counters, the achieved rate (packets per second while running) and the summary of every stage as a dict
+        """
+
+        elapsed = self.elapsed()
+        return {
+            "packetsSent": self.packetsSent,
+            "bytesSent": self.bytesSent,
+            "sendErrors": self.sendErrors,
+            "packetsCoalesced": self.packetsCoalesced,
+            "elapsed": elapsed,
+            "achievedRate": self.packetsSent / elapsed if elapsed > 0 else 0.0,
+            "stages": dict((stage, histogram.summary()) for stage, histogram in self.stages.items()),
+            }
+
+
+def prometheusText(stats, prefix="pav"):
+    """
+    Renders a stats dict (as returned by GenerateAndBroadcast.stats) in the Prometheus text exposition format.
+    Counters end in _total, the stage timings are summaries in seconds with the p50/p90/p99/p99.9 quantiles
+    @return: The exposition text (a string ending with a newline)
+    """
+
+    lines = []
+
+    def metric(name, kind, help, value):
+        if value is None:
+            return
+        lines.append("# HELP %s_%s %s" % (prefix, name, help))
+        lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+        lines.append("%s_%s %r" % (prefix, name, value))
+
+    metric("packets_sent_total", "counter", "Packets handed to the sender", stats["packetsSent"])
+    metric("bytes_sent_total", "counter", "Bytes handed to the sender", stats["bytesSent"])
+    metric("send_errors_total", "counter", "Packets dropped because the send failed", stats["sendErrors"])
+    metric("packets_coalesced_total", "counter", "Packets skipped to catch up", stats["packetsCoalesced"])
+    metric("sets_generated_total", "counter", "Sets generated, seeks included", stats["setsGenerated"])
+    if "sender" in stats:
+        metric("drops_total", "counter", "Packets dropped because the send buffer was full", stats["sender"]["drops"])
+        metric("losses_total", "counter", "Packets dropped or reported missing by the receivers", stats["sender"]["losses"])
+        metric("send_buffer_bytes", "gauge", "Size of the socket send buffer", stats["sender"]["sendBufferSize"])
+    metric("target_rate", "gauge", "Target packets per second", stats["targetRate"])
+    metric("achieved_rate", "gauge", "Packets per second sent while running", stats["achievedRate"])
+
+    lines.append("# HELP %s_stage_seconds Time spent per packet in each stage (sampled)" % prefix)
+    lines.append("# TYPE %s_stage_seconds summary" % prefix)
+    for stage, summary in sorted(stats["stages"].items()):
+        for quantile, key in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99"), ("0.999", "p999")):
+            lines.append('%s_stage_seconds{stage="%s",quantile="%s"} %r' % (prefix, stage, quantile, summary[key]))
+        lines.append('%s_stage_seconds_sum{stage="%s"} %r' % (prefix, stage, summary["mean"] * summary["count"]))
+        lines.append('%s_stage_seconds_count{stage="%s"} %d' % (prefix, stage, summary["count"]))
+    return "\n".join(lines) + "\n"
+
+
+class PAVStatsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    HTTP handler of the stats endpoint: /metrics returns prometheusText, /stats the same numbers as JSON
+
+    @cvar statsSource: The function returning the stats dict, set on a subclass per server (see GenerateAndBroadcast.serveStats)
+    """
+
+    statsSource = None
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body = prometheusText(self.statsSource()).encode("utf-8")
+            contentType = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/stats":
+            body = json.dumps(self.statsSource(), sort_keys=True).encode("utf-8")
+            contentType = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes are not worth a line on the console each
+
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_char_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+        ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _loadSendmmsg():
+    """
+    Returns libc's sendmmsg (linux only) or None when it is not available
+    """
+
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+_sendmmsg = _loadSendmmsg()
+
+
+def _loadRecvmmsg():
+    """
+    Returns libc's recvmmsg (linux only) or None when it is not available
+    """
+
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        recvmmsg = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    return recvmmsg
+
+_recvmmsg = _loadRecvmmsg()
+
+
+
+class UDPSender:
+    """
+    Sends datagrams to one destination over a single persistent (connected) UDP socket.
+    With a batchSize above 1 datagrams are queued and flushed together, using one sendmmsg call
+    where available and a loop of sends otherwise. A batch is flushed once it holds batchSize
+    datagrams or once its oldest datagram has been queued for flushInterval seconds. A sending thread about to block
+    calls flushBefore, so datagrams are not held back while no packets come.
+    When ip is a multicast group (224.0.0.0/4) the multicast TTL, loopback and interface are set on the socket.
+    A datagram the kernel has no room for (EAGAIN, EWOULDBLOCK or ENOBUFS, non-blocking sockets get them when
+    the send buffer is full) is dropped and counted in drops instead of raising, so a slow network degrades the stream.
+    A receiver can report its losses back with acks (see PAVReceiver), pollAcks reads them.
+
+    @cvar DROP_ERRORS: The errnos of a datagram dropped for lack of room
+    @cvar ACK: The struct of an ack (b"PA", the highest packet number received, the number of packets missing up to it),
+    both uint32: the packet number wraps around like in PAVBinaryCodec
+    @ivar destination: The (ip, port) datagrams are sent to
+    @ivar isMulticast: True when the destination is a multicast group
+    @ivar sendBufferSize: The size of the socket's send buffer (SO_SNDBUF, as reported by the kernel)
+    @ivar drops: The number of datagrams dropped because there was no room for them
+    @ivar ackedPacketNumber: The highest packet number the receiver acked (0 without acks), each ack is unwrapped next to the previous one
+    @ivar remoteLosses: The packets the receiver found missing up to ackedPacketNumber, as of its last ack
+    @ivar batchSize: The number of datagrams flushed together (1 sends immediately)
+    @ivar flushInterval: The longest time (seconds) a queued datagram waits for a full batch
+    @ivar queuedSince: When (time.perf_counter()) the oldest queued datagram was queued, None when none is
+    @ivar useSendmmsg: if True, batches are flushed with sendmmsg
+    @ivar packetsSent: The number of datagrams sent in total
+    @ivar bytesSent: The number of payload bytes sent in total
+    @ivar sendCalls: The number of send syscalls made in total
+    @ivar packetsPerSecond: The packet rate over the last completed one second window
+    @ivar bytesPerSecond: The byte rate over the last completed one second window
+    """
+
+    DROP_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+    ACK = struct.Struct("<2sII")
+
+    def __init__(self, ip, port, batchSize=1, flushInterval=0.001, multicastTTL=1, multicastLoop=True, multicastInterface=None,
+                 sendBufferSize=None, blocking=True):
+        """
+        @param multicastTTL: The number of router hops multicast datagrams may cross (1 stays on the local network)
+        @param multicastLoop: if True, multicast datagrams are also delivered to receivers on this host
+        @param multicastInterface: The ip of the local interface multicast datagrams leave from (default the system's choice)
+        @param sendBufferSize: if set, the SO_SNDBUF size (bytes) to ask for, the kernel may round or double it
+        @param blocking: if False, a full send buffer drops datagrams instead of blocking the sending thread
+        """
+
+        self.destination = (ip, port)
+        self.batchSize = max(1, int(batchSize))
+        self.flushInterval = flushInterval
+        self.useSendmmsg = _sendmmsg is not None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # UDP
+        try:
+            self.isMulticast = ipaddress.ip_address(ip).is_multicast
+        except ValueError:
+            self.isMulticast = False  # a host name
+        if self.isMulticast:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, multicastTTL)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if multicastLoop else 0)
+            if multicastInterface is not None:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(multicastInterface))
+        if sendBufferSize is not None:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sendBufferSize)
+        self.sendBufferSize = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        self.sock.setblocking(blocking)
+        self.sock.connect(self.destination)
+        self.drops = 0
+        self.ackedPacketNumber = 0
+        self.remoteLosses = 0
+        self.pending = []
+        self.queuedSince = None
+        self.lastFlush = time.perf_counter()
+        self.iovecs = None
+        self.messages = None
+
+        self.packetsSent = 0
+        self.bytesSent = 0
+        self.sendCalls = 0
+        self.packetsPerSecond = 0.0
+        self.bytesPerSecond = 0.0
+        self.windowStart = self.lastFlush
+        self.windowPackets = 0
+        self.windowBytes = 0
+
+    def send(self, packet):
+        """
+        Sends (or queues, when batching) one datagram
+        @param packet: The datagram (bytes or any buffer, such as a memoryview)
+        """
+
+        if self.batchSize == 1:
+            try:
+                self.sock.send(packet)
+            except OSError as exception:
+                if exception.errno not in self.DROP_ERRORS:
+                    raise
+                self.drops = self.drops + 1
+                return
+            self.__count(1, len(packet), 1)
+            return
+
+        now = time.perf_counter()
+        if not self.pending:
+            self.queuedSince = now
+        self.pending.append(packet)
+        if len(self.pending) >= self.batchSize or now - self.queuedSince >= self.flushInterval:
+            self.flush()
+
+    def flushBefore(self, deadline):
+        """
+        Flushes the queue now if its oldest datagram would have waited longer than flushInterval by deadline.
+        The sending thread calls it before it blocks until deadline (a time.perf_counter() value)
+        """
+
+        if self.pending and deadline - self.queuedSince > self.flushInterval:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends every queued datagram
+        """
+
+        self.lastFlush = time.perf_counter()
+        if not self.pending:
+            return
+        packets = self.pending
+        self.pending = []
+        self.queuedSince = None
+
+        if self.useSendmmsg:
+            calls, sent = self.__sendmmsg(packets)
+            self.__count(sent, sum(len(packet) for packet in packets[:sent]), calls)
+            self.drops = self.drops + len(packets) - sent
+            return
+
+        sent = 0
+        size = 0
+        calls = 0
+        try:
+            for packet in packets:
+                calls = calls + 1
+                try:
+                    self.sock.send(packet)
+                except OSError as exception:
+                    if exception.errno not in self.DROP_ERRORS:
+                        raise
+                    self.drops = self.drops + 1
+                    continue
+                sent = sent + 1
+                size = size + len(packet)
+        finally:
+            self.__count(sent, size, calls)
+
+    def close(self):
+        """
+        Flushes the queue and closes the socket
+        """
+
+        try:
+            self.flush()
+        finally:
+            self.sock.close()
+
+    def pollAcks(self):
+        """
+        Reads the acks the receiver sent back (without waiting) and updates ackedPacketNumber and remoteLosses
+        @return: The number of acks read
+        """
+
+        acks = 0
+        while select.select([self.sock], [], [], 0)[0]:
+            try:
+                reply = self.sock.recv(64)
+            except OSError:
+                continue  # an ICMP error, the sends report those
+            if len(reply) != self.ACK.size:
+                continue
+            magic, packetNumber, missing = self.ACK.unpack(reply)
+            if self.ackedPacketNumber:
+                packetNumber = unwrapPacketNumber(packetNumber, self.ackedPacketNumber)
+            if magic == b"PA" and packetNumber >= self.ackedPacketNumber:
+                self.ackedPacketNumber = packetNumber
+                self.remoteLosses = missing
+                acks = acks + 1
+        return acks
+
+    def losses(self):
+        """
+        Returns the packets lost so far, dropped here or found missing by the receiver
+        """
+
+        return self.drops + self.remoteLosses
+
+    def throughput(self):
+        """
+        Returns the throughput counters as a dict
+        """
+
+        return {
+            "packetsSent": self.packetsSent,
+            "bytesSent": self.bytesSent,
+            "sendCalls": self.sendCalls,
+            "drops": self.drops,
+            "remoteLosses": self.remoteLosses,
+            "sendBufferSize": self.sendBufferSize,
+            "packetsPerSecond": self.packetsPerSecond,
+            "bytesPerSecond": self.bytesPerSecond,
+            }
+
+    def __sendmmsg(self, packets):
+        """
+        Sends packets with as few sendmmsg calls as possible, the packets from the first one dropped for lack of room on are dropped
+        @return: (the number of calls made, the number of packets sent)
+        """
+
+        count = len(packets)
+        if self.messages is None or len(self.messages) < count:
+            # the headers are reused between flushes, only the buffers change
+            self.iovecs = (_IOVec * count)()
+            self.messages = (_MMsgHdr * count)()
+            for index in range(count):
+                self.messages[index].msg_hdr.msg_iov = ctypes.pointer(self.iovecs[index])
+                self.messages[index].msg_hdr.msg_iovlen = 1
+        iovecs = self.iovecs
+        for index, packet in enumerate(packets):
+            iovecs[index].iov_base = packet if type(packet) is bytes else bytes(packet)  # c_char_p only takes bytes
+            iovecs[index].iov_len = len(packet)
+
+        calls = 0
+        offset = 0
+        address = ctypes.addressof(self.messages)
+        while offset < count:
+            sent = _sendmmsg(self.sock.fileno(), address + offset * ctypes.sizeof(_MMsgHdr), count - offset, 0)
+            calls = calls + 1
+            if sent < 0:
+                error = ctypes.get_errno()
+                if error in self.DROP_ERRORS:
+                    break
+                raise OSError(error, os.strerror(error))
+            offset = offset + sent
+        return calls, offset
+
+    def __count(self, packets, size, calls):
+        """
+        Updates the totals and the one second throughput window
+        """
+
+        self.packetsSent = self.packetsSent + packets
+        self.bytesSent = self.bytesSent + size
+        self.sendCalls = self.sendCalls + calls
+        self.windowPackets = self.windowPackets + packets
+        self.windowBytes = self.windowBytes + size
+
+        now = time.perf_counter()
+        elapsed = now - self.windowStart
+        if elapsed >= 1.0:
+            self.packetsPerSecond = self.windowPackets / elapsed
+            self.bytesPerSecond = self.windowBytes / elapsed
+            self.windowStart = now
+            self.windowPackets = 0
+            self.windowBytes = 0
+
+
+
+class UDPFanOut:
+    """
+    Sends every datagram to a set of destinations, one UDPSender (socket) each, so a packet is encoded once and sent N times.
+    Destinations can be added and removed from any thread while another one sends: the sending thread
+    only reads an immutable tuple of senders that is swapped under a lock, and removed senders are closed by the sending thread.
+    A destination refusing a datagram does not stop the others, the send only raises when every destination failed.
+
+    @ivar batchSize: The batchSize of every UDPSender
+    @ivar flushInterval: The flushInterval of every UDPSender
+    @ivar senders: The UDPSender of every destination (a tuple, replaced on every change)
+    @ivar packetsSent: The number of datagrams handed to a sender, over all destinations
+    @ivar bytesSent: The number of payload bytes handed to a sender, over all destinations
+    @ivar sendErrors: The number of datagrams a destination refused
+    @ivar sendBufferSize: The SO_SNDBUF size asked for every socket, None for the system default
+    @ivar blocking: if False, the sockets drop datagrams when their send buffer is full (see UDPSender)
+    @ivar closed: True once close was called, destinations can no longer be added
+    """
+
+    def __init__(self, batchSize=1, flushInterval=0.001, sendBufferSize=None, blocking=True):
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.sendBufferSize = sendBufferSize
+        self.blocking = blocking
+        self.senders = ()
+        self.retired = []
+        self.lock = threading.Lock()
+        self.packetsSent = 0
+        self.bytesSent = 0
+        self.sendErrors = 0
+        self.retiredCalls = 0
+        self.retiredLosses = 0
+        self.closed = False
+
+    def addDestination(self, ip, port, multicastTTL=1, multicastLoop=True, multicastInterface=None):
+        """
+        Starts sending to (ip, port), nothing changes when it is a destination already
+        The multicast options only apply to multicast groups, see UDPSender
+        @return: The UDPSender of the destination
+        """
+
+        with self.lock:
+            if self.closed:
+                raise ValueError("the fan out is closed")
+            for sender in self.senders:
+                if sender.destination == (ip, port):
+                    return sender
+            sender = UDPSender(ip, port, self.batchSize, self.flushInterval, multicastTTL, multicastLoop, multicastInterface,
+                               self.sendBufferSize, self.blocking)
+            self.senders = self.senders + (sender,)
+            return sender
+
+    def removeDestination(self, ip, port):
+        """
+        Stops sending to (ip, port)
+        @return: True if it was a destination
+        """
+
+        with self.lock:
+            kept = tuple(sender for sender in self.senders if sender.destination != (ip, port))
+            if len(kept) == len(self.senders):
+                return False
+            self.retired.extend(sender for sender in self.senders if sender.destination == (ip, port))
+            self.senders = kept
+            if self.closed:
+                self.__closeRetired()
+            return True
+
+    def destinations(self):
+        """
+        Returns the (ip, port) of every destination
+        """
+
+        return [sender.destination for sender in self.senders]
+
+    def send(self, packet):
+        """
+        Sends (or queues, when batching) one datagram to every destination
+        """
+
+        if self.retired:
+            with self.lock:
+                self.__closeRetired()
+        senders = self.senders
+        error = None
+        failures = 0
+        for sender in senders:
+            try:
+                sender.send(packet)
+            except OSError as exception:
+                error = exception
+                failures = failures + 1
+                continue
+            self.packetsSent = self.packetsSent + 1
+            self.bytesSent = self.bytesSent + len(packet)
+        if failures:
+            self.sendErrors = self.sendErrors + failures
+            if failures == len(senders):
+                raise error
+
+    def flush(self):
+        """
+        Sends every queued datagram of every destination
+        """
+
+        for sender in self.senders:
+            sender.flush()
+
+    def flushBefore(self, deadline):
+        """
+        Flushes the destinations whose oldest queued datagram would have waited longer than flushInterval by deadline
+        (see UDPSender.flushBefore), raises the OSError only when every destination refused its datagrams
+        """
+
+        senders = self.senders
+        error = None
+        failures = 0
+        for sender in senders:
+            try:
+                sender.flushBefore(deadline)
+            except OSError as exception:
+                error = exception
+                failures = failures + 1
+        if failures:
+            self.sendErrors = self.sendErrors + failures
+            if failures == len(senders):
+                raise error
+
+    def close(self):
+        """
+        Flushes and closes every destination
+        """
+
+        with self.lock:
+            self.closed = True
+            self.retired.extend(self.senders)
+            self.__closeRetired()
+
+    def pollAcks(self):
+        """
+        Reads the acks of every destination (see UDPSender.pollAcks)
+        @return: The number of acks read
+        """
+
+        return sum(sender.pollAcks() for sender in self.senders)
+
+    def losses(self):
+        """
+        Returns the packets lost so far over all destinations, dropped here or found missing by the receivers
+        """
+
+        return self.retiredLosses + sum(sender.losses() for sender in self.senders)
+
+    def throughput(self):
+        """
+        Returns the throughput counters summed over the destinations as a dict (see UDPSender.throughput)
+        """
+
+        senders = self.senders
+        return {
+            "destinations": len(senders),
+            "packetsSent": self.packetsSent,
+            "bytesSent": self.bytesSent,
+            "sendErrors": self.sendErrors,
+            "drops": sum(sender.drops for sender in senders),
+            "losses": self.losses(),
+            "sendBufferSize": max([sender.sendBufferSize for sender in senders] or [0]),
+            "sendCalls": self.retiredCalls + sum(sender.sendCalls for sender in senders),
+            "packetsPerSecond": sum(sender.packetsPerSecond for sender in senders),
+            "bytesPerSecond": sum(sender.bytesPerSecond for sender in senders),
+            }
+
+    def __closeRetired(self):
+        """
+        Closes the removed senders (the caller holds the lock)
+        """
+
+        for sender in self.retired:
+            try:
+                sender.close()
+            except OSError:
+                pass  # the destination refused the last batch
+            self.retiredCalls = self.retiredCalls + sender.sendCalls
+            self.retiredLosses = self.retiredLosses + sender.losses()
+        self.retired = []
+
+
+
+class RateScheduler:
+    """
+    Paces a loop on an absolute deadline clock (time.perf_counter) instead of sleeping between iterations,
+    so the time spent working between waits does not make the rate drift.
+    Deadlines are start + n / rate. When the loop stalls, the next wait reports every deadline that was
+    missed so the caller can send a catch-up burst (at most maxBurst, older deadlines are skipped).
+
+    @cvar MIN_RATE: The lowest supported rate (per second)
+    @cvar MAX_RATE: The highest supported rate (per second)
+    @ivar rate: The target rate (per second)
+    @ivar interval: The time between two deadlines (seconds)
+    @ivar maxBurst: The most ticks a single wait can report, None for no limit
+    @ivar spinTime: The final part of every wait (seconds) is busy waited, sleeping is not precise enough for it
+    """
+
+    MIN_RATE = 1
+    MAX_RATE = 100000
+
+    def __init__(self, rate, maxBurst=None, spinTime=0.001):
+        if not self.MIN_RATE <= rate <= self.MAX_RATE:
+            raise ValueError("rate must be between %d and %d per second" % (self.MIN_RATE, self.MAX_RATE))
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self.maxBurst = maxBurst
+        self.spinTime = spinTime
+        self.start()
+
+    def start(self):
+        """
+        Restarts the clock (and the statistics), the first deadline is one interval from now
+        """
+
+        self.startTime = time.perf_counter()
+        self.epoch = self.startTime
+        self.tickCount = 0
+        self.ticks = 0
+        self.skipped = 0
+        self.bursts = 0
+        self.wakeups = 0
+        self.latenessSum = 0.0
+        self.latenessSquares = 0.0
+        self.latenessMax = 0.0
+
+    def wait(self, killer=None):
+        """
+        Blocks until the next deadline
+        @param killer: An optional threading.Event, the wait returns 0 as soon as it is set
+        @return: The number of ticks due (more than 1 after a stall), 0 if killer was set
+        """
+
+        deadline = self.nextDeadline()
+        now = time.perf_counter()
+        remaining = deadline - now
+        if remaining > self.spinTime:
+            if killer is None:
+                time.sleep(remaining - self.spinTime)
+            elif killer.wait(remaining - self.spinTime):
+                return 0
+        if killer is not None and killer.is_set():
+            return 0
+        while now < deadline:
+            now = time.perf_counter()
+
+        lateness = now - deadline
+        due = int(lateness / self.interval) + 1
+        if self.maxBurst is not None and due > self.maxBurst:
+            self.skipped = self.skipped + due - self.maxBurst
+            self.tickCount = self.tickCount + due - self.maxBurst
+            due = self.maxBurst
+        if due > 1:
+            self.bursts = self.bursts + 1
+
+        self.tickCount = self.tickCount + due
+        self.ticks = self.ticks + due
+        self.wakeups = self.wakeups + 1
+        self.latenessSum = self.latenessSum + lateness
+        self.latenessSquares = self.latenessSquares + lateness * lateness
+        self.latenessMax = max(self.latenessMax, lateness)
+        return due
+
+    def nextDeadline(self):
+        """
+        Returns the time (time.perf_counter()) wait blocks until
+        """
+
+        return self.epoch + (self.tickCount + 1) * self.interval
+
+    def setRate(self, rate):
+        """
+        Changes the rate from the next deadline on, the deadlines before it keep the old interval (so no burst or gap follows)
+        @param rate: The new target rate (per second, clamped to MIN_RATE and MAX_RATE)
+        """
+
+        rate = min(max(rate, self.MIN_RATE), self.MAX_RATE)
+        self.epoch = self.epoch + self.tickCount * self.interval
+        self.tickCount = 0
+        self.rate = rate
+        self.interval = 1.0 / rate
+
+    def stats(self):
+        """
+        Returns the achieved rate and the jitter (lateness of each wakeup behind its deadline, in seconds) as a dict
+        """
+
+        elapsed = time.perf_counter() - self.startTime
+        wakeups = max(1, self.wakeups)
+        mean = self.latenessSum / wakeups
+        variance = max(0.0, self.latenessSquares / wakeups - mean * mean)
+        return {
+            "targetRate": self.rate,
+            "achievedRate": self.ticks / elapsed if elapsed > 0 else 0.0,
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "bursts": self.bursts,
+            "jitterMean": mean,
+            "jitterStdDev": variance ** 0.5,
+            "jitterMax": self.latenessMax,
+            }
+
+
+
+class AIMDRateController:
+    """
+    Adapts the rate of a RateScheduler to the losses of a sender, like TCP congestion control:
+    every interval the rate grows by increase while nothing was lost and is multiplied by decrease when packets were lost,
+    always staying between minRate and maxRate. Losses are the drops of the sender and the losses its receivers ack.
+
+    @ivar scheduler: The RateScheduler whose rate is adapted
+    @ivar minRate: The lowest rate (per second)
+    @ivar maxRate: The highest rate (per second)
+    @ivar increase: The rate added per interval without losses (per second)
+    @ivar decrease: The factor the rate is multiplied by after an interval with losses
+    @ivar interval: The time between two adjustments (seconds)
+    @ivar increases: The number of times the rate went up
+    @ivar decreases: The number of times the rate went down
+    @ivar lastLosses: The losses counted at the last adjustment
+    """
+
+    def __init__(self, scheduler, minRate=RateScheduler.MIN_RATE, maxRate=None, increase=None, decrease=0.5, interval=0.1):
+        """
+        @param maxRate: The highest rate (default the scheduler's rate when the controller is made)
+        @param increase: The rate added per interval without losses (default a twentieth of maxRate)
+        """
+
+        self.scheduler = scheduler
+        self.minRate = minRate
+        self.maxRate = scheduler.rate if maxRate is None else maxRate
+        self.increase = self.maxRate / 20.0 if increase is None else increase
+        self.decrease = decrease
+        self.interval = interval
+        self.increases = 0
+        self.decreases = 0
+        self.lastLosses = None
+        self.nextUpdate = time.perf_counter() + interval
+
+    def update(self, sender):
+        """
+        Adjusts the rate when an interval has passed, call it from the sending loop (it returns at once otherwise)
+        @param sender: The UDPSender or UDPFanOut whose acks are read and whose losses drive the rate
+        @return: The rate (per second)
+        """
+
+        now = time.perf_counter()
+        if now < self.nextUpdate:
+            return self.scheduler.rate
+        self.nextUpdate = now + self.interval
+        sender.pollAcks()
+        losses = sender.losses()
+        if self.lastLosses is not None and losses > self.lastLosses:
+            self.decreases = self.decreases + 1
+            self.scheduler.setRate(max(self.minRate, self.scheduler.rate * self.decrease))
+        elif self.scheduler.rate < self.maxRate:
+            self.increases = self.increases + 1
+            self.scheduler.setRate(min(self.maxRate, self.scheduler.rate + self.increase))
+        self.lastLosses = losses
+        return self.scheduler.rate
+
+    def stats(self):
+        """
+        Returns the current rate and the adjustments made as a dict
+        """
+
+        return {
+            "rate": self.scheduler.rate,
+            "minRate": self.minRate,
+            "maxRate": self.maxRate,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "losses": self.lastLosses or 0,
+            }
+
+
+
+class PAVCodec:
+    """
+    The interface of a wire format used by GenerateAndBroadcast.
+    A codec is compiled for a channel registry (the broadcaster binds it to its generator's channels),
+    encode turns a packet from PAVDataCollection into the bytes to send and decode turns those bytes back
+    into a dict holding one value per channel name plus the packetNumber.
+    A codec with sendTimes also carries the send time (time.time()) of every packet, for the one way latency
+    PAVReceiver measures: encode writes the encoding time and stamp rewrites it just before the packet is sent.
+
+    @ivar channels: The channel registry the codec is compiled for
+    @ivar sendTimes: if True, packets carry their send time (decoded as sendTime)
+    """
+
+    sendTimes = False
+
+    def __init__(self, channels=None):
+        self.channels = None
+        if channels is not None:
+            self.setChannels(channels)
+
+    def setChannels(self, channels):
+        """
+        Compiles the codec for a channel registry
+        """
+
+        self.channels = channels
+        self.compile()
+
+    def compile(self):
+        """
+        Rebuilds the precompiled layout, needed whenever a channel is added to the registry
+        """
+
+        raise NotImplementedError
+
+    def encode(self, PAVGeneratedData):
+        """
+        Converts a packet from PAVDataCollection to the bytes sent over UDP
+        """
+
+        raise NotImplementedError
+
+    def decode(self, payload):
+        """
+        Converts received bytes back to a dict of channel name to value (and packetNumber)
+        """
+
+        raise NotImplementedError
+
+    def stamp(self, payload):
+        """
+        Returns the encoded packet with its send time set to now (the packet unchanged without sendTimes)
+        """
+
+        return payload
+
+    def toText(self, payload):
+        """
+        Returns an encoded packet as readable text (used when printing packets)
+        """
+
+        return json.dumps(self.decode(payload))
+
+
+
+class PAVJsonCodec(PAVCodec):
+    """
+    Encodes packets straight to JSON bytes from a template precompiled for the channel registry,
+    without building a PAVDataStructure or calling json.dumps.
+    The output is byte for byte what GenerateAndBroadcast.jsonConversion produces (same key order and separators),
+    packets holding anything but finite floats and ints are handed to json.dumps to keep it that way.
+    With sendTimes a "sendTime" key always comes last, written with SEND_TIME_FORMAT so it has a fixed width
+    (17 characters until the year 2286) and stamp can overwrite it in place.
+
+    @cvar SEND_TIME_FORMAT: The format of the sendTime value
+    """
+
+    _PLAIN_TYPES = frozenset([float, int])
+    SEND_TIME_FORMAT = "%.6f"
+
+    def __init__(self, channels=None, sendTimes=False):
+        """
+        @param sendTimes: if True, every packet ends with a "sendTime" key
+        """
+
+        self.sendTimes = sendTimes
+        PAVCodec.__init__(self, channels)
+
+    def compile(self):
+        self.keys = [channel.name for channel in self.channels] + ["packetNumber"]
+        self.template = "{" + ", ".join("%s: %%r" % json.dumps(key) for key in self.keys) + "}"
+        self.sendTimeSuffix = ', "sendTime": ' + self.SEND_TIME_FORMAT + "}"
+        self.stampSize = len(self.SEND_TIME_FORMAT % time.time()) + 1
+
+    def encode(self, PAVGeneratedData):
+        """
+        Converts a packet from PAVDataCollection to JSON
+        @return: The JSON text as bytes, ready to send
+        """
+
+        if len(PAVGeneratedData) != len(self.keys):
+            self.compile()
+        if self._PLAIN_TYPES.issuperset(map(type, PAVGeneratedData)) and math.isfinite(sum(PAVGeneratedData)):
+            text = self.template % tuple(PAVGeneratedData)
+        else:
+            text = json.dumps(dict(zip(self.keys, PAVGeneratedData)))
+        if self.sendTimes:
+            text = text[:-1] + self.sendTimeSuffix % time.time()
+        return text.encode("ascii")
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+    def stamp(self, payload):
+        if not self.sendTimes:
+            return payload
+        return payload[:-self.stampSize] + (self.SEND_TIME_FORMAT % time.time()).encode("ascii") + b"}"
+
+    def toText(self, payload):
+        return payload.decode("ascii")
+
+
+
+class PAVBinaryCodec(PAVCodec):
+    """
+    Compact fixed layout little endian wire format.
+    An 8 byte header (the MAGIC bytes, the schema VERSION, the channel count and the packet number as uint32)
+    is followed by one float32 per channel, 32 bytes for the default six channels.
+    The packet number wraps around to 0 after 2^32 - 1, PAVReceiver unwraps it (see unwrapPacketNumber).
+    Schema SEND_TIME_VERSION (written with sendTimes) puts the send time as a float64 between the header and the values.
+    Float32 keeps about 7 significant digits, decode rounds back to decimals when it is set.
+    decode reads both schema versions whatever sendTimes is.
+
+    @cvar MAGIC: The first two bytes of every packet
+    @cvar VERSION: The schema version written in the header
+    @cvar SEND_TIME_VERSION: The schema version of packets carrying their send time
+    @cvar PACKET_NUMBER_MASK: The largest packet number the header holds, packet numbers are sent modulo PACKET_NUMBER_MASK + 1
+    @ivar decimals: The number of decimals decoded values are rounded to, None keeps the float32 value
+    """
+
+    MAGIC = b"PV"
+    VERSION = 1
+    SEND_TIME_VERSION = 2
+    PACKET_NUMBER_MASK = 0xFFFFFFFF
+    HEADER = struct.Struct("<2sBBI")
+    SEND_TIME = struct.Struct("<d")
+
+    def __init__(self, channels=None, decimals=None, sendTimes=False):
+        """
+        @param sendTimes: if True, packets are written with schema SEND_TIME_VERSION
+        """
+
+        self.decimals = decimals
+        self.sendTimes = sendTimes
+        PAVCodec.__init__(self, channels)
+
+    def compile(self):
+        if len(self.channels) > 255:
+            raise ValueError("the binary format holds at most 255 channels")
+        self.names = [channel.name for channel in self.channels]
+        self.layout = struct.Struct("<2sBBI%df" % len(self.names))
+        self.sendTimeLayout = struct.Struct("<2sBBId%df" % len(self.names))
+
+    def encode(self, PAVGeneratedData):
+        """
+        Packs a packet from PAVDataCollection
+        @return: The packed packet (bytes)
+        """
+
+        if len(PAVGeneratedData) != len(self.names) + 1:
+            self.compile()
+        if self.sendTimes:
+            return self.sendTimeLayout.pack(self.MAGIC, self.SEND_TIME_VERSION, len(self.names), PAVGeneratedData[-1] & self.PACKET_NUMBER_MASK,
+                                            time.time(), *PAVGeneratedData[:-1])
+        return self.layout.pack(self.MAGIC, self.VERSION, len(self.names), PAVGeneratedData[-1] & self.PACKET_NUMBER_MASK, *PAVGeneratedData[:-1])
+
+    def decode(self, payload):
+        magic, version, count, packetNumber = self.HEADER.unpack_from(payload)
+        if magic != self.MAGIC or version not in (self.VERSION, self.SEND_TIME_VERSION):
+            raise ValueError("not a version %d or %d PAV binary packet" % (self.VERSION, self.SEND_TIME_VERSION))
+        if count != len(self.names):
+            raise ValueError("packet has %d channels, the codec expects %d" % (count, len(self.names)))
+
+        if version == self.SEND_TIME_VERSION:
+            values = self.sendTimeLayout.unpack(payload)[5:]
+        else:
+            values = self.layout.unpack(payload)[4:]
+        if self.decimals is not None:
+            values = [round(value, self.decimals) for value in values]
+        packet = dict(zip(self.names, values))
+        packet["packetNumber"] = packetNumber
+        if version == self.SEND_TIME_VERSION:
+            packet["sendTime"] = self.SEND_TIME.unpack_from(payload, self.HEADER.size)[0]
+        return packet
+
+    def stamp(self, payload):
+        if not self.sendTimes:
+            return payload
+        return payload[:self.HEADER.size] + self.SEND_TIME.pack(time.time()) + payload[self.HEADER.size + self.SEND_TIME.size:]
+
+
+
+def benchmarkJsonEncoding(packets=100000, repeat=1):
+    """
+    Times GenerateAndBroadcast.jsonConversion (plus the encode to bytes it needs before sending) against PAVJsonCodec.
+    Every call is timed into a LatencyHistogram, like timeit the best of repeat rounds gives the packets per second
+    @param packets: The number of packets encoded by each path in each round
+    @param repeat: The number of rounds of each path
+    @return: A dict with the packets per second of each path, the speedup and the latency summary of each path over all rounds
+    """
+
+    broadcaster = GenerateAndBroadcast("127.0.0.1", 1111, 1)
+    generated = [broadcaster.datagen.PAVDataCollection() for x in range(packets)]
+    codec = PAVJsonCodec(broadcaster.datagen.channels)
+
+    def timePath(encode):
+        histogram = LatencyHistogram()
+        best = None
+        for round in range(repeat):
+            start = time.perf_counter()
+            for data in generated:
+                callStart = time.perf_counter()
+                encode(data)
+                histogram.record(time.perf_counter() - callStart)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, histogram.summary()
+
+    jsonConversionTime, jsonConversionLatency = timePath(lambda data: broadcaster.jsonConversion(data).encode("utf-8"))
+    codecTime, codecLatency = timePath(codec.encode)
+
+    return {
+        "packets": packets,
+        "jsonConversionPerSecond": packets / jsonConversionTime,
+        "codecPerSecond": packets / codecTime,
+        "speedup": jsonConversionTime / codecTime,
+        "jsonConversionLatency": jsonConversionLatency,
+        "codecLatency": codecLatency,
+        }
+
+
+
+def unwrapPacketNumber(packetNumber, reference):
+    """
+    Recovers a packet number sent as uint32 (the binary codec and the acks wrap it around to 0 after 2^32 - 1).
+    The result is the number matching packetNumber on the low 32 bits that is closest to reference, so it is exact
+    as long as the two are less than 2^31 apart. Full numbers (from the JSON codec) are returned unchanged
+    @param packetNumber: The packet number received
+    @param reference: A full packet number near it, for example the highest one received from the same sender
+    """
+
+    offset = (packetNumber - reference) & PAVBinaryCodec.PACKET_NUMBER_MASK
+    if offset > PAVBinaryCodec.PACKET_NUMBER_MASK // 2:
+        offset = offset - PAVBinaryCodec.PACKET_NUMBER_MASK - 1
+    return reference + offset
+
+
+
+class PAVPeerStats:
+    """
+    The sequence accounting of one sender for PAVReceiver.
+    A packet numbered above the next expected one opens a gap, the packets skipped are missing until they arrive late
+    (reordered). So does a packet numbered below the first one received, for the packets between the two.
+    The highest reorderWindow packet numbers skipped are remembered, a packet older than those (at or below
+    horizon) is taken for a late one, any other packet at or below the highest one that is not missing is a duplicate.
+
+    @ivar first: The lowest packet number received
+    @ivar highest: The highest packet number received
+    @ivar received: The number of packets received, duplicates included
+    @ivar gaps: The number of times packets were skipped
+    @ivar reordered: The number of packets that arrived after a higher numbered one
+    @ivar duplicates: The number of packets received more than once
+    @ivar missing: The set of remembered packet numbers skipped and not received yet
+    @ivar skipped: The deque of the remembered packet numbers skipped (at most reorderWindow), lowest first
+    @ivar horizon: The highest skipped packet number that is no longer remembered (0 for none)
+    """
+
+    def __init__(self, packetNumber, reorderWindow=4096):
+        self.reorderWindow = reorderWindow
+        self.first = packetNumber
+        self.highest = packetNumber
+        self.received = 1
+        self.gaps = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.missing = set()
+        self.skipped = collections.deque()
+        self.horizon = 0
+
+    def add(self, packetNumber):
+        """
+        Accounts for one more packet
+        """
+
+        self.received = self.received + 1
+        if packetNumber == self.highest + 1:
+            self.highest = packetNumber
+        elif packetNumber > self.highest:
+            self.gaps = self.gaps + 1
+            tracked = max(self.highest + 1, packetNumber - self.reorderWindow)
+            if tracked > self.highest + 1:
+                self.horizon = tracked - 1
+            self.missing.update(range(tracked, packetNumber))
+            self.skipped.extend(range(tracked, packetNumber))
+            self.__forget()
+            self.highest = packetNumber
+        elif packetNumber in self.missing:
+            self.missing.remove(packetNumber)
+            self.reordered = self.reordered + 1
+        elif self.first <= packetNumber <= self.horizon:
+            self.reordered = self.reordered + 1
+        elif packetNumber < self.first:
+            self.reordered = self.reordered + 1  # sent before the first one received
+            if packetNumber + 1 < self.first:
+                self.gaps = self.gaps + 1
+                tracked = max(packetNumber + 1, self.first - self.reorderWindow)
+                if tracked > packetNumber + 1:
+                    self.horizon = max(self.horizon, tracked - 1)
+                self.missing.update(range(tracked, self.first))
+                self.skipped.extendleft(range(self.first - 1, tracked - 1, -1))
+                self.__forget()
+            self.first = packetNumber
+        else:
+            self.duplicates = self.duplicates + 1
+
+    def __forget(self):
+        """
+        Forgets the lowest skipped packet numbers beyond reorderWindow, they are taken for late ones when they arrive
+        """
+
+        while len(self.skipped) > self.reorderWindow:
+            evicted = self.skipped.popleft()
+            self.missing.discard(evicted)
+            self.horizon = max(self.horizon, evicted)
+
+    def lost(self):
+        """
+        Returns the number of packets between first and highest that never arrived
+        """
+
+        return self.highest - self.first + 1 - (self.received - self.duplicates)
+
+    def summary(self):
+        """
+        Returns the counters as a dict
+        """
+
+        return {
+            "first": self.first,
+            "highest": self.highest,
+            "received": self.received,
+            "lost": self.lost(),
+            "gaps": self.gaps,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            }
+
+
+
+class PAVReceiver:
+    """
+    Stand-in for the hololens to check a broadcast end to end on one machine: it receives PAV packets on a thread,
+    decodes them (JSON or binary, told apart by the binary MAGIC), keeps a PAVPeerStats per sender to find lost,
+    reordered and duplicate packets, measures the one way latency of packets carrying a sendTime
+    (see PAVCodec.sendTimes, sender and receiver share the clock on one machine) and the received throughput.
+    Datagrams are read in batches of up to batchSize per syscall with recvmmsg where available,
+    with a loop of non-blocking recvfrom_into otherwise. Packets that do not decode are counted in invalid.
+    When ip is a multicast group the receiver joins it.
+    With an ackInterval it acks every sender that often with the highest packet number received and the number lost
+    (UDPSender.ACK), which UDPSender.pollAcks reads and AIMDRateController reacts to. A processingDelay per packet
+    and a small receiveBufferSize make it a slow receiver that loses packets, for testing backpressure.
+
+    @ivar address: The (ip, port) the receiver listens on
+    @ivar useRecvmmsg: if True, batches are read with recvmmsg
+    @ivar peers: A dict of sender address to its PAVPeerStats
+    @ivar latency: The LatencyHistogram of the one way latencies (seconds)
+    @ivar packetsReceived: The number of datagrams received
+    @ivar bytesReceived: The number of payload bytes received
+    @ivar recvCalls: The number of receive syscalls that returned datagrams
+    @ivar invalid: The number of datagrams that were not PAV packets
+    @ivar acksSent: The number of acks sent
+    @ivar firstTime: The perf_counter time of the first datagram, None before it
+    @ivar lastTime: The perf_counter time of the latest datagram
+    """
+
+    def __init__(self, ip="127.0.0.1", port=0, batchSize=64, receiveBufferSize=4 * 1024 * 1024, channels=None, onPacket=None,
+                 multicastInterface="0.0.0.0", pollInterval=0.05, maxSize=65535, ackInterval=None, processingDelay=0.0):
+        """
+        @param ip: The ip to listen on, or a multicast group to join
+        @param port: The port to listen on (0 for any free one, see address)
+        @param batchSize: The most datagrams read per syscall
+        @param receiveBufferSize: The SO_RCVBUF size (bytes) to ask for, the kernel may round or cap it
+        @param channels: The channel registry binary packets are decoded with (default PAVDataGenerator.CHANNELS)
+        @param onPacket: if set, called with every decoded packet (a dict) and the sender address, on the receiving thread
+        @param multicastInterface: The ip of the local interface a multicast group is joined on
+        @param pollInterval: The longest time (seconds) the thread waits for datagrams before checking for stop
+        @param maxSize: The largest datagram (bytes) received whole
+        @param ackInterval: if set, the time (seconds) between two acks to every sender (default no acks)
+        @param processingDelay: The time (seconds) slept after every packet, to act as a slow receiver
+        """
+
+        self.batchSize = max(1, int(batchSize))
+        self.ackInterval = ackInterval
+        self.processingDelay = processingDelay
+        self.onPacket = onPacket
+        self.pollInterval = pollInterval
+        self.maxSize = maxSize
+        self.jsonCodec = PAVJsonCodec()
+        self.binaryCodec = PAVBinaryCodec(PAVDataGenerator.CHANNELS if channels is None else channels)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if receiveBufferSize is not None:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receiveBufferSize)
+        try:
+            isMulticast = ipaddress.ip_address(ip).is_multicast
+        except ValueError:
+            isMulticast = False  # a host name
+        if isMulticast:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(("", port))
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(ip) + socket.inet_aton(multicastInterface))
+            self.address = (ip, self.sock.getsockname()[1])
+        else:
+            self.sock.bind((ip, port))
+            self.address = self.sock.getsockname()
+        self.sock.setblocking(False)
+
+        self.useRecvmmsg = _recvmmsg is not None
+        self.buffer = ctypes.create_string_buffer(self.batchSize * maxSize)
+        self.view = memoryview(self.buffer).cast("B")
+        if self.useRecvmmsg:
+            # the headers and buffers are reused for every batch, the kernel only fills in the lengths and addresses
+            self.names = (ctypes.c_char * (self.batchSize * 16))()
+            self.iovecs = (_IOVec * self.batchSize)()
+            self.messages = (_MMsgHdr * self.batchSize)()
+            for index in range(self.batchSize):
+                self.iovecs[index].iov_base = ctypes.addressof(self.buffer) + index * maxSize
+                self.iovecs[index].iov_len = maxSize
+                header = self.messages[index].msg_hdr
+                header.msg_name = ctypes.addressof(self.names) + index * 16
+                header.msg_iov = ctypes.pointer(self.iovecs[index])
+                header.msg_iovlen = 1
+                header.msg_namelen = 16
+            # a copy to restore the name lengths the kernel overwrites with one memmove, and the lengths it fills in as uints
+            self.pristineMessages = bytes(self.messages)
+            self.lengths = (ctypes.c_uint * (ctypes.sizeof(self.messages) // ctypes.sizeof(ctypes.c_uint))).from_buffer(self.messages)
+            self.lengthStride = ctypes.sizeof(_MMsgHdr) // ctypes.sizeof(ctypes.c_uint)
+            self.lengthOffset = _MMsgHdr.msg_len.offset // ctypes.sizeof(ctypes.c_uint)
+        self.addresses = {}
+
+        self.peers = {}
+        self.latency = LatencyHistogram()
+        self.packetsReceived = 0
+        self.bytesReceived = 0
+        self.recvCalls = 0
+        self.invalid = 0
+        self.acksSent = 0
+        self.firstTime = None
+        self.lastTime = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def decode(self, payload):
+        """
+        Decodes a JSON or binary PAV packet, raises a ValueError for anything else
+        """
+
+        try:
+            if payload[:2] == PAVBinaryCodec.MAGIC:
+                packet = self.binaryCodec.decode(payload)
+            else:
+                packet = self.jsonCodec.decode(payload)
+            packet["packetNumber"] = int(packet["packetNumber"])
+        except (KeyError, TypeError, UnicodeDecodeError, struct.error):
+            raise ValueError("not a PAV packet")
+        return packet
+
+    def start(self):
+        """
+        Starts receiving on a daemon thread
+        """
+
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.__receive)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the thread (after it read what has arrived) and closes the socket
+        """
+
+        self.stopping.set()
+        self.thread.join()
+        self.sock.close()
+
+    def poll(self, timeout=0.0):
+        """
+        Waits up to timeout seconds for datagrams and handles every one that arrived, one batch at a time
+        @return: The number of datagrams handled
+        """
+
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return 0
+        handled = 0
+        while True:
+            count = self.__receiveBatch()
+            handled = handled + count
+            if count < self.batchSize:
+                return handled
+
+    def lost(self):
+        """
+        Returns the number of packets lost over all senders
+        """
+
+        return sum(peer.lost() for peer in list(self.peers.values()))
+
+    def report(self):
+        """
+        Returns the throughput, loss, reordering and latency counters as a dict (latency in seconds)
+        """
+
+        elapsed = 0.0 if self.firstTime is None else self.lastTime - self.firstTime
+        peers = dict(("%s:%d" % address, peer.summary()) for address, peer in list(self.peers.items()))
+        return {
+            "packetsReceived": self.packetsReceived,
+            "bytesReceived": self.bytesReceived,
+            "recvCalls": self.recvCalls,
+            "invalid": self.invalid,
+            "elapsed": elapsed,
+            "packetsPerSecond": self.packetsReceived / elapsed if elapsed else 0.0,
+            "bytesPerSecond": self.bytesReceived / elapsed if elapsed else 0.0,
+            "lost": sum(peer["lost"] for peer in peers.values()),
+            "reordered": sum(peer["reordered"] for peer in peers.values()),
+            "duplicates": sum(peer["duplicates"] for peer in peers.values()),
+            "latency": self.latency.summary(),
+            "peers": peers,
+            }
+
+    def __receive(self):
+        """
+        Body of the receiving thread
+        """
+
+        if self.ackInterval is None:
+            while not self.stopping.is_set():
+                self.poll(self.pollInterval)
+            self.poll()
+            return
+
+        # one batch at a time, so a steady stream does not hold up the acks
+        wait = min(self.pollInterval, self.ackInterval)
+        nextAck = time.perf_counter() + self.ackInterval
+        while not self.stopping.is_set():
+            if select.select([self.sock], [], [], wait)[0]:
+                self.__receiveBatch()
+            now = time.perf_counter()
+            if now >= nextAck:
+                nextAck = now + self.ackInterval
+                self.__sendAcks()
+        self.poll()
+
+    def __sendAcks(self):
+        """
+        Acks every sender with the highest packet number received from it and the number of packets lost
+        """
+
+        for address, peer in list(self.peers.items()):
+            try:
+                mask = PAVBinaryCodec.PACKET_NUMBER_MASK
+                self.sock.sendto(UDPSender.ACK.pack(b"PA", peer.highest & mask, min(peer.lost(), mask)), address)
+                self.acksSent = self.acksSent + 1
+            except OSError:
+                pass  # the sender is gone or the socket is full, the next ack will tell
+
+    def __receiveBatch(self):
+        """
+        Reads one batch of datagrams without waiting and handles them
+        @return: The number of datagrams read
+        """
+
+        datagrams = []
+        view = self.view
+        maxSize = self.maxSize
+        if self.useRecvmmsg:
+            ctypes.memmove(self.messages, self.pristineMessages, len(self.pristineMessages))
+            count = _recvmmsg(self.sock.fileno(), ctypes.addressof(self.messages), self.batchSize, socket.MSG_DONTWAIT, None)
+            if count < 0:
+                error = ctypes.get_errno()
+                if error in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return 0
+                raise OSError(error, os.strerror(error))
+            names = self.names.raw
+            addresses = self.addresses
+            lengths = self.lengths[self.lengthOffset:self.lengthOffset + count * self.lengthStride:self.lengthStride]
+            for index, length in enumerate(lengths):
+                name = names[index * 16:index * 16 + 8]
+                address = addresses.get(name)
+                if address is None:
+                    address = addresses[name] = (socket.inet_ntoa(name[4:8]), int.from_bytes(name[2:4], "big"))
+                datagrams.append((bytes(view[index * maxSize:index * maxSize + length]), address))
+        else:
+            for index in range(self.batchSize):
+                try:
+                    size, address = self.sock.recvfrom_into(view[index * maxSize:(index + 1) * maxSize])
+                except (BlockingIOError, InterruptedError):
+                    break
+                datagrams.append((bytes(view[index * maxSize:index * maxSize + size]), address))
+        if not datagrams:
+            return 0
+
+        now = time.time()
+        self.lastTime = time.perf_counter()
+        if self.firstTime is None:
+            self.firstTime = self.lastTime
+        self.recvCalls = self.recvCalls + (1 if self.useRecvmmsg else len(datagrams))
+        for payload, address in datagrams:
+            self.packetsReceived = self.packetsReceived + 1
+            self.bytesReceived = self.bytesReceived + len(payload)
+            try:
+                packet = self.decode(payload)
+            except ValueError:
+                self.invalid = self.invalid + 1
+                continue
+            peer = self.peers.get(address)
+            if peer is None:
+                self.peers[address] = PAVPeerStats(packet["packetNumber"])
+            else:
+                packet["packetNumber"] = unwrapPacketNumber(packet["packetNumber"], peer.highest)
+                peer.add(packet["packetNumber"])
+            if "sendTime" in packet:
+                self.latency.record(max(0.0, now - packet["sendTime"]))
+            if self.onPacket is not None:
+                self.onPacket(packet, address)
+            if self.processingDelay:
+                time.sleep(self.processingDelay)
+        return len(datagrams)
+
+
+
+class PAVSetPipeline:
+    """
+    Double buffered producer/consumer pipeline: a worker thread generates the next set and encodes it to wire bytes
+    while the current set is sent, so the send loop only indexes into encoded packets.
+    Finished sets wait in a bounded queue (depth sets), the worker blocks when it is full.
+    The generator runs ahead of the packets sent, stop moves it back (seekPacket) to the first packet not sent.
+    An exception in the worker ends it and is raised again by nextPacket once the sets prepared before it are used up.
+
+    @cvar WAIT: The longest time (seconds) nextPacket waits for a set before checking the worker is still alive
+    @ivar datagen: The PAVDataGenerator the worker draws from (owned by the pipeline while it runs)
+    @ivar codec: The PAVCodec the worker encodes with
+    @ivar depth: The number of encoded sets that can wait in the queue
+    @ivar setsPrepared: The number of sets (or partial first sets) the worker has prepared
+    @ivar stats: The PAVStats the worker records its generate and encode timings in, None to not time them
+    @ivar config: The PAVConfig whose generator settings the worker applies before each new set, None for none
+    @ivar error: The exception that ended the worker, None while it works
+    """
+
+    WAIT = 0.1
+
+    def __init__(self, datagen, codec, depth=2, stats=None, config=None):
+        self.datagen = datagen
+        self.codec = codec
+        self.depth = depth
+        self.stats = stats
+        self.config = config
+        self.setsPrepared = 0
+        self.error = None
+        self.sets = queue.Queue(maxsize=depth)
+        self.stopping = threading.Event()
+        self.worker = None
+        self.front = []
+        self.frontIndex = 0
+        self.frontPacketNumber = datagen.packetNumber + 1
+
+    def start(self):
+        """
+        Starts the worker thread
+        """
+
+        self.stopping.clear()
+        self.error = None
+        self.worker = threading.Thread(target=self.__prepareSets)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def nextPacket(self):
+        """
+        Returns the next encoded packet, swapping to the next prepared set when the current one is used up
+        Raises the exception that ended the worker (a RuntimeError if it ended without one) instead of waiting forever
+        """
+
+        if self.frontIndex >= len(self.front):
+            while True:
+                try:
+                    firstPacketNumber, packets = self.sets.get(timeout=self.WAIT)
+                    break
+                except queue.Empty:
+                    if not self.worker.is_alive() and self.sets.empty():
+                        raise RuntimeError("the pipeline worker stopped")
+            if firstPacketNumber is None:
+                raise packets  # the worker failed
+            self.frontPacketNumber, self.front = firstPacketNumber, packets
+            self.frontIndex = 0
+        packet = self.front[self.frontIndex]
+        self.frontIndex = self.frontIndex + 1
+        return packet
+
+    def stop(self):
+        """
+        Stops the worker and moves the generator back to the first packet that was not handed out
+        """
+
+        self.stopping.set()
+        while self.worker.is_alive():
+            try:
+                self.sets.get_nowait()
+            except queue.Empty:
+                pass
+            self.worker.join(0.01)
+        self.sets = queue.Queue(maxsize=self.depth)
+        self.datagen.seekPacket(self.frontPacketNumber + self.frontIndex)
+        self.front = []
+        self.frontIndex = 0
+        self.frontPacketNumber = self.datagen.packetNumber + 1
+
+    def __prepareSets(self):
+        """
+        Body of the worker thread: prepares the rest of the current set and then whole sets until stopped
+        """
+
+        while not self.stopping.is_set():
+            try:
+                if self.config is not None and self.config.state[0] != self.datagen.settingsVersion and self.datagen.isAtSetBoundary():
+                    version, settings = self.config.state
+                    self.datagen.applySettings(settings, version)
+                firstPacketNumber = self.datagen.packetNumber + 1
+                remaining = self.datagen.PACKETS_PER_SET - self.datagen.setCount
+                if remaining <= 0:
+                    remaining = self.datagen.PACKETS_PER_SET
+                if self.stats is None:
+                    packets = [self.codec.encode(self.datagen.PAVDataCollection()) for x in range(remaining)]
+                else:
+                    packets = self.__prepareTimed(remaining)
+            except Exception as exception:
+                self.error = exception
+                firstPacketNumber, packets = None, exception  # handed to nextPacket, which raises it
+            else:
+                self.setsPrepared = self.setsPrepared + 1
+            while not self.stopping.is_set():
+                try:
+                    self.sets.put((firstPacketNumber, packets), timeout=0.05)
+                    break
+                except queue.Full:
+                    pass
+            if self.error is not None:
+                return
+
+    def __prepareTimed(self, count):
+        """
+        Generates and encodes count packets, timing every stats.sampleEvery-th one
+        """
+
+        packets = []
+        generate = self.stats.stages["generate"]
+        encode = self.stats.stages["encode"]
+        for x in range(count):
+            if x % self.stats.sampleEvery:
+                packets.append(self.codec.encode(self.datagen.PAVDataCollection()))
+                continue
+            start = time.perf_counter()
+            data = self.datagen.PAVDataCollection()
+            generated = time.perf_counter()
+            packets.append(self.codec.encode(data))
+            generate.record(generated - start)
+            encode.record(time.perf_counter() - generated)
+        return packets
+
+
+
+class PAVRecorder:
+    """
+    Appends encoded packets with their timestamps to a binary log that PAVReplayer can replay.
+    The log is a header (MAGIC, VERSION, 0) followed by one record per packet: RECORD (timestamp in seconds
+    as a double, payload length) and the payload bytes. Records are only ever appended, opening an existing
+    log continues it, and a record cut short by a crash is ignored by the replayer.
+
+    @cvar MAGIC: The first bytes of every log
+    @cvar VERSION: The log format version written
+    @cvar HEADER: The struct of the log header
+    @cvar RECORD: The struct in front of every payload
+    @ivar path: The path of the log
+    @ivar packetsRecorded: The number of packets this recorder appended
+    @ivar bytesRecorded: The number of payload bytes this recorder appended
+    """
+
+    MAGIC = b"PAVL"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHH")
+    RECORD = struct.Struct("<dI")
+
+    def __init__(self, path, bufferSize=1 << 20):
+        """
+        @param path: The log file, created when it does not exist
+        @param bufferSize: The bytes buffered before a write to the file
+        """
+
+        self.path = path
+        self.packetsRecorded = 0
+        self.bytesRecorded = 0
+        self.file = open(path, "ab", buffering=bufferSize)
+        if self.file.tell() == 0:
+            self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION, 0))
+        else:
+            with open(path, "rb") as existing:
+                PAVReplayer.checkHeader(existing.read(self.HEADER.size))
+
+    def record(self, packet, timestamp=None):
+        """
+        Appends one packet
+        @param packet: The encoded packet (bytes)
+        @param timestamp: When the packet was sent (seconds, default time.time())
+        """
+
+        self.file.write(self.RECORD.pack(time.time() if timestamp is None else timestamp, len(packet)))
+        self.file.write(packet)
+        self.packetsRecorded = self.packetsRecorded + 1
+        self.bytesRecorded = self.bytesRecorded + len(packet)
+
+    def recordGenerated(self, datagen, codec, count, rate, startTime=0.0):
+        """
+        Records count packets of datagen as if they were sent at rate per second, without sending or waiting.
+        This is the quick way to record a canonical flight
+        @param codec: The PAVCodec the packets are encoded with (bound to datagen's channels)
+        @param startTime: The timestamp of the first packet
+        """
+
+        codec.setChannels(datagen.channels)
+        for index in range(count):
+            self.record(codec.encode(datagen.PAVDataCollection()), startTime + index / float(rate))
+
+    def flush(self):
+        """
+        Writes the buffered records to the file
+        """
+
+        self.file.flush()
+
+    def close(self):
+        """
+        Flushes and closes the log
+        """
+
+        self.file.close()
+
+
+class PAVReplayer:
+    """
+    Replays a PAVRecorder log from a read only memory map: every payload is a memoryview of the mapping,
+    so with an unbatched UDPSender datagrams go from the page cache to the socket without being copied or decoded
+    (a batched sender copies them, sendmmsg needs bytes).
+    The payloads handed out are only valid until close.
+
+    @ivar path: The path of the log
+    @ivar size: The size of the log (bytes)
+    @ivar packetsReplayed: The number of packets sent by replay
+    @ivar sendErrors: The number of packets replay dropped because the sender raised an OSError
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.packetsReplayed = 0
+        self.sendErrors = 0
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size < PAVRecorder.HEADER.size:
+            self.file.close()
+            raise ValueError("%s is not a PAV log" % path)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.checkHeader(self.map[:PAVRecorder.HEADER.size])
+
+    @staticmethod
+    def checkHeader(header):
+        """
+        Raises a ValueError when header (bytes) is not the header of a log this version can read
+        """
+
+        magic, version, flags = PAVRecorder.HEADER.unpack(header)
+        if magic != PAVRecorder.MAGIC:
+            raise ValueError("not a PAV log")
+        if version != PAVRecorder.VERSION:
+            raise ValueError("unsupported PAV log version %d" % version)
+
+    def records(self):
+        """
+        Yields (timestamp, payload) for every complete record, payload is a memoryview of the mapping
+        """
+
+        unpack = PAVRecorder.RECORD.unpack_from
+        recordSize = PAVRecorder.RECORD.size
+        offset = PAVRecorder.HEADER.size
+        while offset + recordSize <= self.size:
+            timestamp, length = unpack(self.map, offset)
+            start = offset + recordSize
+            offset = start + length
+            if offset > self.size:
+                return  # cut short while recording
+            yield timestamp, self.view[start:offset]
+
+    def count(self):
+        """
+        Returns the number of complete records in the log
+        """
+
+        return sum(1 for record in self.records())
+
+    def replay(self, sender, speed=1.0, killer=None, spinTime=0.001):
+        """
+        Sends every packet of the log through sender, spaced as they were recorded.
+        Deadlines are absolute (first send + timestamp offset / speed), as in RateScheduler, so the timing does not drift
+        @param sender: The UDPSender to send with (it is flushed, not closed)
+        @param speed: How many times faster than recorded to replay (10 for ten times), None or 0 sends as fast as possible
+        @param killer: A threading.Event that stops the replay when set
+        @param spinTime: The final part of every wait (seconds) is busy waited
+        @return: The number of packets sent (packets the socket refuses are counted in sendErrors instead)
+        """
+
+        sent = 0
+        first = None
+        clock = time.perf_counter
+        for timestamp, packet in self.records():
+            if speed:
+                if first is None:
+                    first = timestamp
+                    begin = clock()
+                deadline = begin + (timestamp - first) / speed
+                try:
+                    sender.flushBefore(deadline)
+                except OSError:
+                    self.sendErrors = self.sendErrors + 1
+                remaining = deadline - clock()
+                if remaining > spinTime:
+                    if killer is None:
+                        time.sleep(remaining - spinTime)
+                    elif killer.wait(remaining - spinTime):
+                        break
+                while clock() < deadline:
+                    pass
+            elif killer is not None and killer.is_set():
+                break
+            try:
+                sender.send(packet)
+            except OSError:
+                self.sendErrors = self.sendErrors + 1
+                continue
+            sent = sent + 1
+        sender.flush()
+        self.packetsReplayed = self.packetsReplayed + sent
+        return sent
+
+    def close(self):
+        """
+        Unmaps and closes the log, the mapping stays until the last payload handed out is gone
+        """
+
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # payloads are still referenced, the mapping is closed when they are collected
+        self.file.close()
+
+
+
+class PAVConfig:
+    """
+    Thread-safe settings of a running broadcast, changed without stopping it.
+    The settings are a dict that is never modified once published: update validates the changes and swaps in
+    a new (version, settings) tuple, so readers only compare a version number per packet and never take a lock.
+    GenerateAndBroadcast applies the broadcast settings (rate, delay) at the next packet and the generator settings
+    (PAVDataGenerator constants such as MAX_AIRSPEED or PACKETS_PER_SET) at the next set boundary.
+    Settings can also be loaded from a JSON file (loadFile, watchFile) or sent to a local control socket (serveControl).
+    A broadcaster using the config adds a check (addCheck) that rejects the settings it cannot apply.
+
+    @cvar BROADCAST_SETTINGS: The settings of the broadcaster, all other settings are PAVDataGenerator constants
+    @ivar state: The (version, settings) tuple, replaced as a whole by every update
+    @ivar checks: The functions every update is passed to before it is published, see addCheck
+    @ivar lastError: The message of the last file or control update that was rejected, None if there was none
+    """
+
+    BROADCAST_SETTINGS = ("rate", "delay")
+
+    def __init__(self, settings=None):
+        self.lock = threading.Lock()
+        self.state = (0, {})
+        self.checks = []
+        self.lastError = None
+        self.stopping = threading.Event()
+        self.threads = []
+        self.controlSocket = None
+        if settings:
+            self.update(settings)
+
+    def update(self, settings=None, **moreSettings):
+        """
+        Changes some settings, all of them or none (a ValueError is raised for any that is not valid)
+        @param settings: A dict of setting name to value, settings can also be given as keywords
+        @return: The new version
+        """
+
+        changes = dict(settings or {})
+        changes.update(moreSettings)
+        for name, value in changes.items():
+            self.check(name, value)
+        for check in self.checks:
+            check(changes)
+        with self.lock:
+            version, current = self.state
+            merged = dict(current)
+            merged.update(changes)
+            self.state = (version + 1, merged)
+            return version + 1
+
+    def settings(self):
+        """
+        Returns a copy of the current settings
+        """
+
+        return dict(self.state[1])
+
+    def addCheck(self, check):
+        """
+        Adds a check of the updates, it is called with the dict of changed settings and raises a ValueError to reject them.
+        The check is run on the current settings at once (raising the same way)
+        """
+
+        check(self.settings())
+        self.checks.append(check)
+
+    @classmethod
+    def check(cls, name, value):
+        """
+        Raises a ValueError when value is not a valid value of the setting name
+        """
+
+        if name in cls.BROADCAST_SETTINGS:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or (name == "rate" and value == 0):
+                raise ValueError("%s must be a positive number" % name)
+            return
+        if not name.isupper() or name == "CHANNELS" or not hasattr(PAVDataGenerator, name):
+            raise ValueError("unknown setting %s" % name)
+        default = getattr(PAVDataGenerator, name)
+        if isinstance(default, bool):
+            if not isinstance(value, bool):
+                raise ValueError("%s must be true or false" % name)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError("%s must be a number" % name)
+        elif name in ("PACKETS_PER_SET", "NUM_DECIMALS") and (not isinstance(value, int) or value < (1 if name == "PACKETS_PER_SET" else 0)):
+            raise ValueError("%s must be an integer of at least %d" % (name, 1 if name == "PACKETS_PER_SET" else 0))  # 2.0 breaks range and round
+
+    def loadFile(self, path):
+        """
+        Updates the settings from a JSON file holding an object of setting name to value
+        @return: The new version
+        """
+
+        with open(path) as stored:
+            settings = json.load(stored)
+        if not isinstance(settings, dict):
+            raise ValueError("%s does not hold a JSON object" % path)
+        return self.update(settings)
+
+    def watchFile(self, path, interval=0.5):
+        """
+        Loads path now and again every time it changes (checked every interval seconds) on a daemon thread.
+        A file that does not load is skipped (see lastError), the settings stay as they were
+        """
+
+        self.loadFile(path)
+        thread = threading.Thread(target=self.__watch, args=(path, interval))
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def serveControl(self, port=0, host="127.0.0.1"):
+        """
+        Listens for updates on a local UDP control socket on a daemon thread.
+        Every datagram is a JSON object of settings to change ({} changes nothing), the reply is a JSON object
+        with the version and the settings, or with the error when the update was rejected
+        @return: The (host, port) of the control socket
+        """
+
+        self.controlSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.controlSocket.bind((host, port))
+        self.controlSocket.settimeout(0.1)
+        thread = threading.Thread(target=self.__control, args=(self.controlSocket,))
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+        return self.controlSocket.getsockname()
+
+    def stop(self):
+        """
+        Stops watching the file and serving the control socket
+        """
+
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.controlSocket is not None:
+            self.controlSocket.close()
+            self.controlSocket = None
+        self.stopping.clear()
+
+    def __watch(self, path, interval):
+        """
+        Body of the file watching thread
+        """
+
+        modified = os.stat(path).st_mtime_ns
+        while not self.stopping.wait(interval):
+            try:
+                changed = os.stat(path).st_mtime_ns
+                if changed != modified:
+                    modified = changed
+                    self.loadFile(path)
+            except (OSError, ValueError) as exception:
+                self.lastError = str(exception)
+
+    def __control(self, controlSocket):
+        """
+        Body of the control socket thread
+        """
+
+        while not self.stopping.is_set():
+            try:
+                request, address = controlSocket.recvfrom(65535)
+            except socket.timeout:
+                continue
+            try:
+                settings = json.loads(request)
+                if not isinstance(settings, dict):
+                    raise ValueError("send a JSON object of settings")
+                version = self.update(settings) if settings else self.state[0]
+                reply = {"version": version, "settings": self.settings()}
+            except ValueError as exception:
+                self.lastError = str(exception)
+                reply = {"error": str(exception)}
+            try:
+                controlSocket.sendto(json.dumps(reply, sort_keys=True).encode("utf-8"), address)
+            except OSError:
+                pass
+
+
+
+class GenerateAndBroadcast:
+
+
+    """
+    Use an instance of this class to invoke the PAV Data Generator.
+    Data packs will start being continiously both on construction (calls sendUDP()) or when startUDP() is called
+    data packets will contine to be send until stopUDP() is called.
+    
+    
+    @ivar isPrinting: if True, packets are printed to the python console.
+    @ivar sender: The UDPFanOut of the running broadcast (one persistent socket per destination), None before the first start
+    @ivar destinations: The destinations packets are sent to, a dict of (ip, port) to the multicast options given to addDestination,
+    in the order they were added
+    @ivar codec: The PAVCodec that encodes the packets sent (PAVJsonCodec unless another codec is given)
+    @ivar pipeline: The PAVSetPipeline of the running broadcast when a pipelineDepth was given, None otherwise
+    @ivar scheduler: The RateScheduler pacing the broadcast when a rate was given, None when delay is slept between packets
+    @ivar statistics: The PAVStats of this broadcaster (kept across restarts), read it with stats()
+    @ivar statsServer: The HTTP server started by serveStats, None when stats are not served
+    @ivar recorder: The PAVRecorder every packet broadcast is appended to, None to not record
+    @ivar rateController: The AIMDRateController adapting the rate when a minRate was given, None otherwise
+    @ivar coalesce: if True, a catch-up burst only sends its newest packet, the older ones are generated and skipped
+    @ivar config: The PAVConfig of the broadcast, update it to change settings while running
+    """
+
+    isPrinting = False;
+
+    def __init__(self, hololens_ip, hololens_port, delay, batchSize=1, flushInterval=0.001, rate=None, maxBurst=None, codec=None, seed=None,
+                 pipelineDepth=None, recorder=None, sendBufferSize=None, minRate=None, coalesce=False, config=None):
+        """
+        This is the constructor
+        @param hololens_ip: The ip of the hololens (s string), more destinations can be added with addDestination (None for none yet)
+        @param hololens_port: the port the hololens is listening on (as int)
+        @param delay: The amount of time (sleep) between each packet
+        @param batchSize: The number of packets sent per syscall (1 sends every packet immediately)
+        @param flushInterval: The longest time (seconds) a packet waits for its batch to fill
+        @param rate: if set, packets are sent at this many per second on a drift free RateScheduler and delay is ignored
+        @param maxBurst: The most packets sent at once to catch up after a stall (rate mode only, None for no limit)
+        @param codec: The PAVCodec used to encode packets, for example PAVBinaryCodec() (default PAVJsonCodec)
+        @param seed: The seed of the generated data, the same seed sends the same packets (default a random seed)
+        @param pipelineDepth: if set, sets are generated and encoded ahead on a PAVSetPipeline with room for this many sets
+        @param recorder: if set, a PAVRecorder every packet broadcast is recorded to (with its send time) for PAVReplayer
+        @param sendBufferSize: The SO_SNDBUF size (bytes) of the sockets, packets that find it full are dropped and counted (default the system's)
+        @param minRate: if set (rate mode only), the rate adapts between minRate and rate to the losses (see AIMDRateController)
+        @param coalesce: if True, when the broadcast falls behind only the newest packet is sent instead of a catch-up burst
+        @param config: The PAVConfig to take settings from, several broadcasters can share one (default a new, empty PAVConfig).
+        It may change the rate only in rate mode and the delay only without a rate, other updates are rejected
+        """
+        
+        self.ip = hololens_ip
+        self.port = hololens_port
+        self.seed = seed
+        self.datagen = PAVDataGenerator(seed)
+        #constants can be set at the top of PAVDataGenerator Class
+        self.waitTime = delay
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.sender = None
+        self.sendBufferSize = sendBufferSize
+        self.destinations = {}
+        self.destinationLock = threading.Lock()
+        if hololens_ip is not None:
+            self.destinations[(hololens_ip, hololens_port)] = {}
+        self.pipelineDepth = pipelineDepth
+        self.pipeline = None
+        self.setCodec(PAVJsonCodec() if codec is None else codec)
+        self.scheduler = None if rate is None else RateScheduler(rate, maxBurst)
+        if minRate is not None and self.scheduler is None:
+            raise ValueError("an adaptive rate needs a rate")
+        self.rateController = None if minRate is None else AIMDRateController(self.scheduler, minRate)
+        self.coalesce = coalesce
+        self.config = PAVConfig() if config is None else config
+        self.config.addCheck(self.__checkSettings)
+        self.broadcastVersion = 0
+        self.statistics = PAVStats()
+        self.statsServer = None
+        self.recorder = recorder
+        self.generationKiller = threading.Event()
+        self.isFirstStart = True;
+        
+    def setCodec(self, codec):
+        """
+        Selects the wire format, the codec is bound to this broadcaster's channel registry
+        @param codec: A PAVCodec instance (PAVJsonCodec, PAVBinaryCodec or your own)
+        """
+
+        codec.setChannels(self.datagen.channels)
+        self.codec = codec
+
+    def jsonDefault(self, object):
+        """
+        needed for json generation
+        """
+
+        return object.__dict__
+
+
+    def jsonConversion(self, PAVGeneratedData):
+        """
+        Gets a packet from the data generator
+        Puts each generated packet into an instance the struct tyoe.
+        The struct containing the data is converted to a string using JSON
+        This generated string is what is sent over UDP
+        """
+        
+        dataPacket = self.PAVDataStructure(
+            self.datagen.channels,
+            PAVGeneratedData[:-1], # one value per channel
+            PAVGeneratedData[-1], # packet number
+            )
+        jsonPAVDataStructure = json.dumps(dataPacket, default=self.jsonDefault)
+        return str(jsonPAVDataStructure)
+
+
+    def __startThread(self, generationKiller, sender):
+        """
+        Sends the JSON generated string to the hololens via UDP continiously until stop udp is called
+        @param sender: The UDPSender holding the socket connected to the hololens
+        """
+
+        self.statistics.start()
+        try:
+            if self.scheduler is None:
+                while True:
+                    self.__flushBefore(sender, time.perf_counter() + self.waitTime)
+                    if generationKiller.wait(self.waitTime):
+                        break
+                    self.__sendPacket(sender)
+            else:
+                self.scheduler.start()
+                due = self.scheduler.wait(generationKiller)
+                while due:
+                    if self.coalesce and due > 1:
+                        for x in range(due - 1):
+                            self.__skipPacket()
+                        due = 1
+                    for x in range(due):
+                        self.__sendPacket(sender)
+                    if self.rateController is not None:
+                        self.rateController.update(sender)
+                    self.__flushBefore(sender, self.scheduler.nextDeadline())
+                    due = self.scheduler.wait(generationKiller)
+        finally:
+            self.statistics.stop()
+            if self.recorder is not None:
+                self.recorder.flush()
+            if self.pipeline is not None:
+                self.pipeline.stop()
+            sender.close()
+
+    def __flushBefore(self, sender, deadline):
+        """
+        Sends the queued datagrams that would wait past flushInterval while the thread blocks until deadline,
+        a batch the socket refuses is counted in sendErrors
+        """
+
+        try:
+            sender.flushBefore(deadline)
+        except OSError:
+            self.statistics.sendErrors = self.statistics.sendErrors + 1
+
+    def __applyConfig(self):
+        """
+        Applies the changed settings of config: rate and delay at once, the generator settings once the current set is used up
+        (with a pipeline its worker applies those)
+        """
+
+        version, settings = self.config.state
+        if version != self.broadcastVersion:
+            self.broadcastVersion = version
+            if "delay" in settings:
+                self.waitTime = settings["delay"]
+            if "rate" in settings and self.scheduler is not None and settings["rate"] != self.scheduler.rate:
+                if self.rateController is not None:
+                    # the controller only lowers the rate after losses, a lower maximum is applied at once
+                    self.rateController.maxRate = settings["rate"]
+                    self.rateController.minRate = min(self.rateController.minRate, settings["rate"])
+                    self.rateController.increase = settings["rate"] / 20.0
+                    self.scheduler.setRate(min(self.scheduler.rate, settings["rate"]))
+                else:
+                    self.scheduler.setRate(settings["rate"])
+        if self.pipeline is None and version != self.datagen.settingsVersion and self.datagen.isAtSetBoundary():
+            self.datagen.applySettings(settings, version)
+
+    def __checkSettings(self, settings):
+        """
+        Rejects the settings config would be updated with that this broadcaster cannot apply:
+        a rate when it sleeps delay between packets and a delay when it sends at a rate
+        """
+
+        if "rate" in settings and self.scheduler is None:
+            raise ValueError("rate needs a broadcaster started with a rate, this one sleeps delay between packets")
+        if "delay" in settings and self.scheduler is not None:
+            raise ValueError("delay needs a broadcaster started without a rate, this one sends at a rate")
+
+    def __skipPacket(self):
+        """
+        Moves past one packet without sending it, the stream stays the same as if it was sent
+        """
+
+        if self.pipeline is not None:
+            self.pipeline.nextPacket()
+        else:
+            self.datagen.PAVDataCollection()
+        self.statistics.packetsCoalesced = self.statistics.packetsCoalesced + 1
+
+    def __sendPacket(self, sender):
+        """
+        Generates, converts and sends a single packet, a packet the socket refuses is counted in sendErrors and dropped
+        """
+
+        version = self.config.state[0]
+        if version != self.broadcastVersion or (version != self.datagen.settingsVersion and self.pipeline is None):
+            self.__applyConfig()
+
+        statistics = self.statistics
+        sampled = statistics.isSampled()
+        if self.pipeline is not None:
+            packet = self.pipeline.nextPacket() #generated and encoded ahead by the pipeline worker (which times them)
+        elif sampled:
+            start = time.perf_counter()
+            data = self.datagen.PAVDataCollection()
+            generated = time.perf_counter()
+            packet = self.codec.encode(data)
+            encoded = time.perf_counter()
+            statistics.stages["generate"].record(generated - start)
+            statistics.stages["encode"].record(encoded - generated)
+        else:
+            data = self.datagen.PAVDataCollection() #Get your data from sensors or whereever
+            packet = self.codec.encode(data) #wire format bytes (by default the same JSON as jsonConversion)
+        if self.codec.sendTimes:
+            packet = self.codec.stamp(packet)
+        if self.isPrinting:
+            print(self.codec.toText(packet))
+        if sampled:
+            start = time.perf_counter()
+        try:
+            sender.send(packet)
+        except OSError:
+            statistics.sendErrors = statistics.sendErrors + 1
+        else:
+            statistics.packetsSent = statistics.packetsSent + 1
+            statistics.bytesSent = statistics.bytesSent + len(packet)
+        if sampled:
+            statistics.stages["send"].record(time.perf_counter() - start)
+        if self.recorder is not None:
+            self.recorder.record(packet)
+
+    def start(self):
+        """
+        use to start sending packets (on its own thread)
+        """
+        if not self.isFirstStart:
+            self.stop()
+        else:
+            self.isFirstStart = False
+        with self.destinationLock:
+            self.sender = UDPFanOut(self.batchSize, self.flushInterval, self.sendBufferSize, blocking=False)
+            for (ip, port), options in self.destinations.items():
+                self.sender.addDestination(ip, port, **options)
+        if self.pipelineDepth is not None:
+            self.pipeline = PAVSetPipeline(self.datagen, self.codec, self.pipelineDepth, self.statistics, self.config)
+            self.pipeline.start()
+        self.generationThread = threading.Thread(target=self.__startThread, args=(self.generationKiller, self.sender))
+        self.generationThread.start()
+        print("Data Generation and Broadcast started!")
+        
+    def stop(self):
+        """
+        Stop generation and end the generation thread
+        """
+        self.generationKiller.set()
+        self.generationThread.join()
+        self.generationKiller = threading.Event()
+        print("Data Generation and Broadcast stopped!")
+        
+
+    def resetPacketNumber(self):
         """
-        resets the data generator instance (packet count etc)
+        resets the data generator instance (packet count etc), with a seed given to the constructor the same packets are sent again
         """
         
-        self.datagen = PAVDataGenerator()
+        self.datagen = PAVDataGenerator(self.seed, self.datagen.model)
+        self.codec.setChannels(self.datagen.channels)  # the config settings are applied to the new generator too
+
+    def addDestination(self, ip, port, multicastTTL=1, multicastLoop=True, multicastInterface=None):
+        """
+        Sends every packet to (ip, port) as well, also while running (from any thread). Every destination gets the same packets
+        @param ip: The ip of another hololens, or a multicast group (224.0.0.0 to 239.255.255.255) every listening hololens joins
+        @param multicastTTL: The number of router hops multicast packets may cross (1 stays on the local network)
+        @param multicastLoop: if True, multicast packets are also delivered to receivers on this computer
+        @param multicastInterface: The ip of the local interface multicast packets leave from (default the system's choice)
+        """
+
+        with self.destinationLock:
+            options = {"multicastTTL": multicastTTL, "multicastLoop": multicastLoop, "multicastInterface": multicastInterface}
+            self.destinations[(ip, port)] = options
+            if self.sender is not None and not self.sender.closed:
+                try:
+                    self.sender.addDestination(ip, port, **options)
+                except ValueError:
+                    pass  # the broadcast stopped meanwhile, the next start sends to it
+
+    def removeDestination(self, ip, port):
+        """
+        Stops sending to (ip, port), also while running (from any thread)
+        @return: True if it was a destination
+        """
+
+        with self.destinationLock:
+            if self.destinations.pop((ip, port), None) is None:
+                return False
+            if self.sender is not None:
+                self.sender.removeDestination(ip, port)
+            return True
+
+    def stats(self):
+        """
+        Returns what the broadcaster has done so far as a dict, safe to call from any thread while it runs:
+        packetsSent, bytesSent, sendErrors, setsGenerated, targetRate (None without a rate or delay),
+        achievedRate, elapsed, stages (the summary of the generate, encode and send timings, in seconds),
+        and the scheduler and sender stats when they exist.
+        When generate or encode is slow next to send the generator is the bottleneck, otherwise the network is
+        """
+
+        stats = self.statistics.snapshot()
+        stats["setsGenerated"] = self.datagen.setsGenerated
+        if self.scheduler is not None:
+            stats["targetRate"] = self.scheduler.rate
+            stats["scheduler"] = self.scheduler.stats()
+        else:
+            stats["targetRate"] = 1.0 / self.waitTime if self.waitTime > 0 else None
+        if self.sender is not None:
+            stats["sender"] = self.sender.throughput()
+        if self.rateController is not None:
+            stats["rateController"] = self.rateController.stats()
+        return stats
+
+    def serveStats(self, port=9108, host="127.0.0.1"):
+        """
+        Serves stats() over HTTP on a daemon thread, /metrics in the Prometheus text format and /stats as JSON
+        @param port: The port to listen on (0 picks a free port, see statsServer.server_address)
+        @param host: The address to listen on, only local by default
+        @return: The http.server.ThreadingHTTPServer serving the stats
+        """
+
+        self.stopServingStats()
+        handler = type("PAVStatsHandler", (PAVStatsHandler,), {"statsSource": staticmethod(self.stats)})
+        self.statsServer = http.server.ThreadingHTTPServer((host, port), handler)
+        self.statsServer.daemon_threads = True
+        serverThread = threading.Thread(target=self.statsServer.serve_forever)
+        serverThread.daemon = True
+        serverThread.start()
+        return self.statsServer
+
+    def stopServingStats(self):
+        """
+        Stops the stats HTTP server, if serveStats started one
+        """
+
+        if self.statsServer is not None:
+            self.statsServer.shutdown()
+            self.statsServer.server_close()
+            self.statsServer = None
 
     class PAVDataStructure:
         """
-        This class has an antribute/field for each data type.
-        It is used as a struct to store each packet and is used by json for encoding
+        This class has an antribute/field for each channel of the generator (named after the channel).
+        It is used as a struct to store each packet and is used by json for encoding.
+        It is made with (channels, values, packetNumber), or with the seven values of the built-in channels
+        (batteryData, altitudeData, headingData, speedData, tempData, fanData, packetNumber) as before the channel registry
         """
 
-        def __init__(
-            self,
-            batteryData,
-            altitudeData,
-            headingData,
-            speedData,
-            tempData,
-            fanData,
-            packetNumber,
-            ):
+        def __init__(self, *args):
             
-            self.batteryData = batteryData
-            self.altitudeData = altitudeData
-            self.headingData = headingData
-            self.speedData = speedData
-            self.tempData = tempData
-            self.fanData = fanData
+            if len(args) == 7:
+                channels, values, packetNumber = PAVDataGenerator.CHANNELS, args[:6], args[6]
+            else:
+                channels, values, packetNumber = args
+            for channel, value in zip(channels, values):
+                setattr(self, channel.name, value)
             self.packetNumber = packetNumber
 
 
+class PAVDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    The asyncio datagram protocol of AsyncGenerateAndBroadcast, it only sends so it just tracks the transport and errors
+
+    @ivar transport: The datagram transport, None until the endpoint is made
+    @ivar sendErrors: The number of errors reported by the transport
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.sendErrors = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def error_received(self, exc):
+        self.sendErrors = self.sendErrors + 1
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+
+
+class AsyncGenerateAndBroadcast:
+    """
+    The asyncio counterpart of GenerateAndBroadcast: the same packets, sent from a task on the running event loop
+    instead of a thread, so one loop can drive thousands of streams.
+    The packets are paced on an absolute deadline clock (the loop's time) so they do not drift.
+
+    @ivar isPrinting: if True, packets are printed to the python console.
+    @ivar protocol: The PAVDatagramProtocol of the running broadcast, None when stopped
+    """
+
+    isPrinting = False
+
+    def __init__(self, hololens_ip, hololens_port, delay, codec=None, seed=None):
+        """
+        @param hololens_ip: The ip of the hololens (s string)
+        @param hololens_port: the port the hololens is listening on (as int)
+        @param delay: The amount of time between each packet
+        @param codec: The PAVCodec used to encode packets (default PAVJsonCodec)
+        @param seed: The seed of the generated data (default a random seed)
+        """
+
+        self.ip = hololens_ip
+        self.port = hololens_port
+        self.waitTime = delay
+        self.seed = seed
+        self.datagen = PAVDataGenerator(seed)
+        self.codec = PAVJsonCodec() if codec is None else codec
+        self.codec.setChannels(self.datagen.channels)
+        self.protocol = None
+        self.task = None
+
+    async def packets(self, count=None):
+        """
+        Async iterator of encoded packets, one every delay seconds
+        @param count: The number of packets to produce, None for no end
+        """
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        produced = 0
+        while count is None or produced < count:
+            deadline = deadline + self.waitTime
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            yield self.codec.encode(self.datagen.PAVDataCollection())
+            produced = produced + 1
+
+    async def start(self):
+        """
+        use to start sending packets (on a task of the running event loop)
+        """
+
+        if self.task is not None:
+            await self.stop()
+        loop = asyncio.get_running_loop()
+        transport, self.protocol = await loop.create_datagram_endpoint(PAVDatagramProtocol, remote_addr=(self.ip, self.port))
+        self.task = loop.create_task(self.__broadcast(transport))
+
+    async def stop(self):
+        """
+        Stop generation and wait for the broadcast task to end
+        """
+
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def __broadcast(self, transport):
+        """
+        Sends packets until the task is cancelled
+        """
+
+        try:
+            async for packet in self.packets():
+                if self.isPrinting:
+                    print(self.codec.toText(packet))
+                transport.sendto(packet)
+        finally:
+            transport.close()
+
+    def resetPacketNumber(self):
+        """
+        resets the data generator instance (packet count etc), with a seed given to the constructor the same packets are sent again
+        """
+
+        self.datagen = PAVDataGenerator(self.seed, self.datagen.model)
+        self.codec.setChannels(self.datagen.channels)
+
+
+
+def _runFleetWorker(vehicleIds, ip, port, portStride, rate, codecType, seed, startBarrier, stopEvent, results):
+    """
+    Body of one PAVFleet worker process.
+    Every vehicle of the shard gets its own generator and codec, vehicles sending to the same destination share one socket.
+    After the start barrier all vehicles send one packet per scheduler tick until stopEvent is set,
+    then the packet counts and the scheduler stats are put on the results queue.
+    A packet the socket refuses (for example after an ICMP port unreachable) is counted in sendErrors and dropped,
+    a worker that cannot get ready breaks the start barrier so PAVFleet.start does not wait for it
+    """
+
+    generators = {}
+    sendErrors = dict((vehicleId, 0) for vehicleId in vehicleIds)
+    senders = {}
+    scheduler = RateScheduler(rate)
+    try:
+        try:
+            vehicles = []
+            for vehicleId in vehicleIds:
+                generators[vehicleId] = PAVDataGenerator(None if seed is None else "%s/%d" % (seed, vehicleId))
+                destination = (ip, port + vehicleId * portStride)
+                if destination not in senders:
+                    senders[destination] = UDPSender(ip, port + vehicleId * portStride)
+                vehicles.append((vehicleId, generators[vehicleId], codecType(generators[vehicleId].channels), senders[destination]))
+        except BaseException:
+            startBarrier.abort()
+            raise
+        startBarrier.wait()
+        scheduler.start()
+        due = scheduler.wait(stopEvent)
+        while due:
+            for x in range(due):
+                for vehicleId, generator, codec, sender in vehicles:
+                    try:
+                        sender.send(codec.encode(generator.PAVDataCollection()))
+                    except OSError:
+                        sendErrors[vehicleId] = sendErrors[vehicleId] + 1
+            due = scheduler.wait(stopEvent)
+    finally:
+        for sender in senders.values():
+            try:
+                sender.close()
+            except OSError:
+                pass
+        results.put({
+            "packetsSent": dict((vehicleId, generator.packetNumber - sendErrors[vehicleId]) for vehicleId, generator in generators.items()),
+            "sendErrors": sendErrors,
+            "scheduler": scheduler.stats(),
+            })
+
+
+
+class PAVFleet:
+    """
+    Runs many independent simulated vehicles, sharded round robin across a pool of worker processes so the GIL is not shared.
+    Each vehicle has its own PAVDataGenerator (and packet counter) and sends rate packets per second,
+    vehicle n sends to port + n * portStride (use a portStride of 1 to give every vehicle its own port).
+    All workers build their generators and sockets first and start sending together, stop ends all of them.
+    Workers that fail to start or to stop in time are terminated, the results only hold the workers that reported.
+
+    @ivar vehicles: The number of simulated vehicles
+    @ivar workers: The number of worker processes
+    @ivar results: The per worker results of the last run (filled by stop)
+    """
+
+    def __init__(self, vehicles, ip, port, rate, workers=None, portStride=0, codecType=None, seed=None):
+        """
+        @param vehicles: The number of simulated vehicles
+        @param ip: The ip the vehicles send to
+        @param port: The port of vehicle 0
+        @param rate: The packets per second sent by each vehicle
+        @param workers: The number of worker processes (default one per cpu, never more than vehicles)
+        @param portStride: The port offset between consecutive vehicles
+        @param codecType: The PAVCodec class every vehicle encodes with (default PAVJsonCodec)
+        @param seed: if given, every vehicle's stream is seeded from it and the vehicle number, so runs repeat
+        """
+
+        self.vehicles = vehicles
+        self.ip = ip
+        self.port = port
+        self.rate = rate
+        self.workers = max(1, min(vehicles, workers or multiprocessing.cpu_count()))
+        self.portStride = portStride
+        self.codecType = PAVJsonCodec if codecType is None else codecType
+        self.seed = seed
+        self.processes = []
+        self.results = []
+
+    def start(self, timeout=30):
+        """
+        Starts every worker process and returns once all of them are ready to send.
+        When a worker fails or they are not ready within timeout, every worker is terminated and a RuntimeError is raised
+        @param timeout: The longest time (seconds) to wait for the workers to get ready
+        """
+
+        if self.processes:
+            self.stop()
+        self.stopEvent = multiprocessing.Event()
+        self.resultQueue = multiprocessing.Queue()
+        startBarrier = multiprocessing.Barrier(self.workers + 1)
+        self.processes = []
+        for worker in range(self.workers):
+            vehicleIds = list(range(worker, self.vehicles, self.workers))
+            process = multiprocessing.Process(
+                target=_runFleetWorker,
+                args=(vehicleIds, self.ip, self.port, self.portStride, self.rate, self.codecType, self.seed,
+                      startBarrier, self.stopEvent, self.resultQueue))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+        try:
+            startBarrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            self.__terminate()
+            raise RuntimeError("the fleet workers did not get ready within %s seconds" % timeout)
+        print("Fleet of %d vehicles started on %d workers!" % (self.vehicles, self.workers))
+
+    def stop(self, timeout=10):
+        """
+        Stops every worker process and collects their results
+        @param timeout: The longest time (seconds) to wait for the workers, the ones still running after it are terminated
+        """
+
+        self.stopEvent.set()
+        deadline = time.time() + timeout
+        self.results = []
+        for process in self.processes:
+            try:
+                self.results.append(self.resultQueue.get(timeout=max(0.0, deadline - time.time())))
+            except queue.Empty:
+                break  # a worker died (or hangs) without reporting
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.time()))
+        self.__terminate()
+        print("Fleet stopped!")
+
+    def stats(self):
+        """
+        Returns the results of the last run as a dict (packets sent per vehicle, in total, the send errors and the achieved rate)
+        """
+
+        packetsSent = {}
+        sendErrors = 0
+        achievedRate = 0.0
+        for result in self.results:
+            packetsSent.update(result["packetsSent"])
+            sendErrors = sendErrors + sum(result["sendErrors"].values())
+            achievedRate = achievedRate + result["scheduler"]["achievedRate"] * len(result["packetsSent"])
+        return {
+            "vehicles": self.vehicles,
+            "workers": self.workers,
+            "packetsSent": sum(packetsSent.values()),
+            "sendErrors": sendErrors,
+            "perVehicle": packetsSent,
+            "targetRate": self.rate * self.vehicles,
+            "achievedRate": achievedRate,
+            }
+
+    def __terminate(self):
+        """
+        Terminates the worker processes that are still running
+        """
+
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.processes = []
+
+
+
+EXPORT_FORMATS = ("npy", "npz", "csv")
+
+
+def _exportChunk(datagen, prefix, format, useBatchEngine, chunkIndex, firstRow, rows):
+    """
+    Body of one exportDataset task: generates rows packets from packet firstRow + 1 on (firstRow is at the start of a set)
+    and writes them to the chunk file of chunkIndex
+    @return: (chunkIndex, file name, rows)
+    """
+
+    packetsPerSet = datagen.PACKETS_PER_SET
+    firstSet = firstRow // packetsPerSet
+    sets = []
+    for setIndex in range(firstSet, firstSet + (rows + packetsPerSet - 1) // packetsPerSet):
+        if useBatchEngine and isinstance(datagen.model, RandomWalkModel):
+            sets.append(datagen.batchDataGeneration(setIndex))
+        else:
+            sets.append(datagen.model.generateArray(datagen, setIndex))
+    values = numpy.concatenate(sets, axis=1)[:, :rows]
+    packetNumbers = numpy.arange(firstRow + 1, firstRow + rows + 1, dtype=numpy.int64)
+    names = [channel.name for channel in datagen.channels]
+
+    fileName = "%s-%05d.%s" % (prefix, chunkIndex, format)
+    if format == "npz":
+        columns = dict(zip(names, values))
+        columns["packetNumber"] = packetNumbers
+        numpy.savez(fileName, **columns)
+    elif format == "npy":
+        numpy.save(fileName, numpy.vstack([values, packetNumbers]).T)
+    else:
+        decimals = [int(datagen.channelSettings(channel)[3]) for channel in datagen.channels]
+        numpy.savetxt(fileName, numpy.vstack([values, packetNumbers]).T, delimiter=",", comments="",
+                      header=",".join(names + ["packetNumber"]), fmt=["%%.%df" % places for places in decimals] + ["%d"])
+    return chunkIndex, os.path.basename(fileName), rows
+
+
+def exportDataset(prefix, rows, format="npz", chunkRows=100000, workers=None, seed=None, datagen=None, useBatchEngine=True):
+    """
+    Writes rows packets of a generator's stream to chunk files, as fast as the cores allow (no pacing, no sockets).
+    Chunks hold whole sets, every set is generated from the seed and its set number only (see generateSet),
+    so chunks are independent and run in parallel on a process pool while the output does not depend on workers.
+    At most two chunks per worker are in flight, so memory stays bounded whatever rows is.
+
+    Chunk n is written to prefix-0000n.<format>, a column per channel and a packetNumber column:
+    npz holds one array per column, npy one (rows, columns) float array and csv one line per row after a header.
+    prefix.json describes the export (columns, chunk files, seed, throughput), loadDataset reads it back
+    @param prefix: The path the file names start with (its directory must exist)
+    @param rows: The number of packets to export
+    @param format: One of EXPORT_FORMATS
+    @param chunkRows: The rows per chunk, rounded down to whole sets (at least one set)
+    @param workers: The number of worker processes (default one per cpu, 1 runs in this process)
+    @param seed: The seed of the stream when no datagen is given (default a random seed, kept in the description)
+    @param datagen: A PAVDataGenerator giving the seed, channels and settings (a snapshot goes to the workers, it is not advanced)
+    @param useBatchEngine: if True, random walk sets are generated with batchDataGeneration, otherwise with the per value engine
+    (other models always generate with their own engine)
+    @return: The description dict that is also written to prefix.json
+    """
+
+    if numpy is None:
+        raise ImportError("numpy is required to export datasets")
+    if format not in EXPORT_FORMATS:
+        raise ValueError("format must be one of %s" % ", ".join(EXPORT_FORMATS))
+    if rows < 0:
+        raise ValueError("rows must not be negative")
+    datagen = PAVDataGenerator(seed) if datagen is None else datagen.snapshot()
+    packetsPerSet = datagen.PACKETS_PER_SET
+    chunkRows = max(1, chunkRows // packetsPerSet) * packetsPerSet
+    chunks = [(index, firstRow, min(chunkRows, rows - firstRow)) for index, firstRow in enumerate(range(0, rows, chunkRows))]
+    workers = max(1, min(len(chunks), workers or multiprocessing.cpu_count()))
+    files = [None] * len(chunks)
+
+    start = time.perf_counter()
+    if workers == 1:
+        for chunk in chunks:
+            index, fileName, chunkSize = _exportChunk(datagen, prefix, format, useBatchEngine, *chunk)
+            files[index] = fileName
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            pending = set()
+            for chunk in chunks:
+                if len(pending) >= 2 * workers:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        index, fileName, chunkSize = future.result()
+                        files[index] = fileName
+                pending.add(pool.submit(_exportChunk, datagen, prefix, format, useBatchEngine, *chunk))
+            for future in concurrent.futures.as_completed(pending):
+                index, fileName, chunkSize = future.result()
+                files[index] = fileName
+    elapsed = time.perf_counter() - start
+
+    description = {
+        "format": format,
+        "rows": rows,
+        "columns": [channel.name for channel in datagen.channels] + ["packetNumber"],
+        "chunks": files,
+        "chunkRows": chunkRows,
+        "packetsPerSet": packetsPerSet,
+        "seed": datagen.seed,
+        "batchEngine": useBatchEngine,
+        "workers": workers,
+        "seconds": elapsed,
+        "rowsPerSecond": rows / elapsed if elapsed > 0 else 0.0,
+        "bytes": sum(os.path.getsize(os.path.join(os.path.dirname(prefix), fileName)) for fileName in files),
+        }
+    with open(prefix + ".json", "w") as output:
+        json.dump(description, output, indent=2)
+    print("Exported %d rows in %.2f s (%.0f rows per second) on %d workers!" % (rows, elapsed, description["rowsPerSecond"], workers))
+    return description
+
+
+def loadDataset(prefix):
+    """
+    Reads back an export of exportDataset
+    @param prefix: The prefix given to exportDataset
+    @return: A dict of column name to numpy array, over all chunks
+    """
+
+    with open(prefix + ".json") as stored:
+        description = json.load(stored)
+    directory = os.path.dirname(prefix)
+    parts = dict((name, []) for name in description["columns"])
+    for fileName in description["chunks"]:
+        path = os.path.join(directory, fileName)
+        if description["format"] == "npz":
+            with numpy.load(path) as chunk:
+                for name in description["columns"]:
+                    parts[name].append(chunk[name])
+        else:
+            if description["format"] == "npy":
+                chunk = numpy.load(path)
+            else:
+                chunk = numpy.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+            for index, name in enumerate(description["columns"]):
+                parts[name].append(chunk[:, index])
+    columns = dict((name, numpy.concatenate(part) if part else numpy.empty(0)) for name, part in parts.items())  # no chunks for 0 rows
+    columns["packetNumber"] = columns["packetNumber"].astype(numpy.int64)
+    return columns
+
+
+
+def receiverMain(arguments=None):
+    """
+    Command line entry point of the receiver (python HololensDataGen.py receive --port 1111),
+    prints the throughput, losses and latency percentiles every interval seconds until interrupted or duration is over
+    """
+
+    parser = argparse.ArgumentParser(prog="HololensDataGen.py receive", description="Receive and check a PAV broadcast")
+    parser.add_argument("--ip", default="0.0.0.0", help="the ip to listen on, or a multicast group to join (default all interfaces)")
+    parser.add_argument("--port", type=int, default=1111)
+    parser.add_argument("--batch-size", type=int, default=64, help="datagrams read per syscall (default 64)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between reports (default 1)")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds (default run until interrupted)")
+    parser.add_argument("--json", action="store_true", help="print the final report as JSON")
+    options = parser.parse_args(arguments)
+
+    receiver = PAVReceiver(options.ip, options.port, options.batch_size)
+    receiver.start()
+    print("Receiving on %s:%d" % receiver.address)
+    end = None if options.duration is None else time.time() + options.duration
+    try:
+        while end is None or time.time() < end:
+            time.sleep(options.interval if end is None else max(0.0, min(options.interval, end - time.time())))
+            report = receiver.report()
+            latency = report["latency"]
+            print("%10d packets %10.1f/s  lost %d  reordered %d  duplicates %d  invalid %d  latency p50 %.1fus p99 %.1fus max %.1fus" % (
+                report["packetsReceived"], report["packetsPerSecond"], report["lost"], report["reordered"], report["duplicates"],
+                report["invalid"], latency["p50"] * 1e6, latency["p99"] * 1e6, latency["max"] * 1e6))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.stop()
+    if options.json:
+        print(json.dumps(receiver.report(), indent=2, sort_keys=True))
+    return 0
+
+
+
 class UnitTests(unittest.TestCase):
 
     # Tests if each value is within next value range for
@@ -483,18 +3825,924 @@ class UnitTests(unittest.TestCase):
                 self.assertLessEqual(testSet[index], testSet[index - 1] + generator.NEXT_VALUE_RANGE_BATTERY)
                 self.assertEqual(len(testSet), generator.PACKETS_PER_SET)
 
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testBatchEngineRangeANDSetSize(self):
+
+        # the batch engine walks on unrounded values, so allow one rounding step of slack
+        generator = PAVDataGenerator()
+        slack = 10 ** -generator.NUM_DECIMALS
+        steps = [generator.NEXT_VALUE_RANGE_BATTERY, generator.NEXT_VALUE_RANGE_ALTITUDE, generator.NEXT_VALUE_RANGE_HEADING,
+                 generator.NEXT_VALUE_RANGE_AIRSPEED, generator.NEXT_VALUE_RANGE_TEMP, generator.NEXT_VALUE_RANGE_FAN]
+
+        for x in range(20):
+            testSet = generator.batchDataGeneration()
+            self.assertEqual(testSet.shape, (6, generator.PACKETS_PER_SET))
+            for row, step in zip(testSet, steps):
+                self.assertTrue(numpy.all(numpy.abs(numpy.diff(row)) <= step + slack))
+            self.assertTrue(numpy.all(testSet >= 0))
+            self.assertTrue(numpy.all(testSet <= 30))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testClampedWalkMatchesLoop(self):
+
+        first = numpy.array([0.5, 29.5])
+        steps = numpy.random.uniform(-2, 2, (2, 777))
+        walks = _clampedWalk(first, steps, 0, 30)
+        for row in range(2):
+            value = first[row]
+            for index in range(1, steps.shape[1]):
+                value = min(max(value + steps[row, index], 0), 30)
+                self.assertAlmostEqual(walks[row, index], value)
+
+        generator = PAVDataGenerator()
+        generator.USE_BATCH_ENGINE = True
+        packet = generator.PAVDataCollection()
+        self.assertEqual(len(packet), 7)
+        self.assertIsInstance(packet[0], float)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testFlightModel(self):
+
+        inputs = numpy.random.uniform(-1, 1, (2, 501))
+        walks = _affineWalk(numpy.array([3.0, -2.0]), 0.9, inputs)
+        for row in range(2):
+            value = walks[row, 0]
+            for index in range(1, inputs.shape[1]):
+                value = 0.9 * value + inputs[row, index]
+                self.assertAlmostEqual(walks[row, index], value)
+
+        generator = PAVDataGenerator(seed=21, model=FlightModel())
+        generator.PACKETS_PER_SET = 2000
+        generator.addChannel(PAVChannel("extraData", 5, 10))
+        data = numpy.array(generator.generateSet(3))
+        self.assertEqual(data.shape, (7, 2000))
+        again = PAVDataGenerator(seed=21, model=FlightModel())
+        again.PACKETS_PER_SET = 2000
+        again.addChannel(PAVChannel("extraData", 5, 10))
+        self.assertEqual(again.generateSet(3), data.tolist())
+        self.assertNotEqual(again.generateSet(4), data.tolist())
+        again.generateSet(200)
+        self.assertEqual(again.generateSet(3), data.tolist())
+        for channel, values in zip(generator.channels, data):
+            minValue, maxValue, nextValueRange, decimals = generator.channelSettings(channel)
+            if channel.settings == "HEADING":
+                minValue, maxValue = 0, 360
+            self.assertTrue(minValue <= values.min() and values.max() <= maxValue, channel.name)
+        battery, altitude, heading, speed, temp, fan, extra = data
+        self.assertTrue((numpy.diff(battery) <= 0).all())
+        self.assertLess(heading.max(), 360)
+        turns = numpy.mod(numpy.diff(heading) + 180, 360) - 180
+        self.assertLessEqual(abs(turns).max(), FlightModel.MAX_TURN_RATE + 0.02)
+        self.assertGreater(numpy.corrcoef(fan, temp)[0, 1], 0.5)
+        self.assertLessEqual(abs(numpy.diff(extra)).max(), 2)
+
+        # the values continue across set boundaries, no step there is larger than the steps within the sets,
+        # also past set 64 where the cached boundaries of the stream are extended
+        generator = PAVDataGenerator(seed=21, model=FlightModel())
+        generator.PACKETS_PER_SET = 50
+        data = numpy.array([generator.PAVDataCollection()[:-1] for x in range(4000)]).T
+        self.assertTrue((numpy.diff(data[0]) <= 0).all())
+        boundaries = numpy.arange(49, 3999, 50)
+        for channel, values in zip(generator.channels, data):
+            steps = numpy.diff(values)
+            if channel.settings == "HEADING":
+                steps = numpy.mod(steps + 180, 360) - 180
+            steps = abs(steps)
+            self.assertLessEqual(steps[boundaries].max(), numpy.delete(steps, boundaries).max() + 0.011, channel.name)
+
+        streaming = PAVDataGenerator(seed=21, model=FlightModel())
+        streaming.STREAMING = True
+        stream = [streaming.PAVDataCollection() for x in range(1200)]
+        generator = PAVDataGenerator(seed=21, model=FlightModel())
+        self.assertEqual(stream, [generator.PAVDataCollection() for x in range(1200)])
+        generator.seekPacket(1001)
+        self.assertEqual(generator.PAVDataCollection(), stream[1000])
+
+    def testChannelRegistry(self):
+
+        broadcaster = GenerateAndBroadcast("127.0.0.1", 1111, 1)
+        broadcaster.datagen.addChannel(PAVChannel("voltageData", 10, 12, 0.5, decimals=3, distribution="gaussian"))
+        self.assertRaises(ValueError, broadcaster.datagen.addChannel, PAVChannel("voltageData"))
+
+        for x in range(2 * broadcaster.datagen.PACKETS_PER_SET):
+            packet = json.loads(broadcaster.jsonConversion(broadcaster.datagen.PAVDataCollection()))
+            self.assertEqual(list(packet), ["batteryData", "altitudeData", "headingData", "speedData",
+                                            "tempData", "fanData", "voltageData", "packetNumber"])
+            self.assertGreaterEqual(packet["voltageData"], 10)
+            self.assertLessEqual(packet["voltageData"], 12)
+            self.assertEqual(packet["packetNumber"], x + 1)
+
+        testSet = broadcaster.datagen.channelDataGeneration(broadcaster.datagen.channel("voltageData"))
+        for index in range(1, len(testSet)):
+            self.assertLessEqual(abs(testSet[index] - testSet[index - 1]), 0.5 + 0.001)
+
+        # the names and the constructor from before the registry still work
+        datagen = broadcaster.datagen
+        self.assertEqual(datagen.batteryLevel, datagen.channelData[0])
+        self.assertEqual(datagen.fanRPM, datagen.channelData[5])
+        self.assertEqual(len(datagen.headingDirection), datagen.PACKETS_PER_SET)
+        self.assertRaises(AttributeError, setattr, datagen, "airspeedLevel", [])
+        self.assertEqual(PAVDataGenerator(seed=1).temperatureLevel, [])
+        packet = json.loads(json.dumps(GenerateAndBroadcast.PAVDataStructure(1, 2, 3, 4, 5, 6, 7), default=broadcaster.jsonDefault))
+        self.assertEqual(packet, {"batteryData": 1, "altitudeData": 2, "headingData": 3, "speedData": 4,
+                                  "tempData": 5, "fanData": 6, "packetNumber": 7})
+
+    def testSeededStreamAndSeek(self):
+
+        for useBatchEngine in set([False, numpy is not None]):
+            generator = PAVDataGenerator(seed=42)
+            generator.USE_BATCH_ENGINE = useBatchEngine
+            history = [generator.PAVDataCollection() for x in range(3 * generator.PACKETS_PER_SET + 7)]
+
+            replay = PAVDataGenerator(seed=42)
+            replay.USE_BATCH_ENGINE = useBatchEngine
+            self.assertEqual([replay.PAVDataCollection() for x in range(len(history))], history)
+            self.assertNotEqual(PAVDataGenerator(seed=43).PAVDataCollection()[:-1], history[0][:-1])
+
+            for packetNumber in (1, 2, 500, 501, 1000, 1234, len(history) - 1, 1):
+                replay.seekPacket(packetNumber)
+                self.assertEqual(replay.PAVDataCollection(), history[packetNumber - 1])
+                self.assertEqual(replay.PAVDataCollection(), history[packetNumber])
+
+        # a far packet is generated directly, without the sets before it
+        generator = PAVDataGenerator(seed="flight-7")
+        generator.seekPacket(3200000)
+        self.assertEqual(generator.setIndex, 6399)
+        packet = generator.PAVDataCollection()
+        self.assertEqual(packet[-1], 3200000)
+        self.assertEqual(packet[:-1], [data[-1] for data in PAVDataGenerator(seed="flight-7").generateSet(6399)])
+
+        # seeking counts sets from where applySettings changed the set size, and moving back before it restores the settings
+        generator = PAVDataGenerator(seed=5)
+        generator.PACKETS_PER_SET = 50
+        history = [generator.PAVDataCollection() for x in range(150)]
+        generator.applySettings({"PACKETS_PER_SET": 20, "MAX_FAN": 10}, 1)
+        history.extend(generator.PAVDataCollection() for x in range(100))
+        self.assertEqual(generator.origins[1][:3], (150, 3, 0))
+        generator.seekPacket(230)
+        self.assertEqual(generator.setIndex, 6)
+        self.assertEqual([generator.PAVDataCollection() for x in range(21)], history[229:])
+        generator.seekPacket(120)
+        self.assertEqual((generator.PACKETS_PER_SET, generator.MAX_FAN, generator.settingsVersion), (50, 30, 0))
+        self.assertEqual([generator.PAVDataCollection() for x in range(31)], history[119:150])
+        generator.applySettings({"PACKETS_PER_SET": 20, "MAX_FAN": 10}, 1)
+        self.assertEqual([generator.PAVDataCollection() for x in range(100)], history[150:])
+
+    def testStreamingLatencyHistogram(self):
+
+        # a set of 20000 packets makes the stall of set mode obvious, it is at the packets starting a set
+        histograms = {}
+        packets = {}
+        boundaries = {}
+        for streaming in (False, True):
+            generator = PAVDataGenerator(seed=7)
+            generator.PACKETS_PER_SET = 20000
+            generator.STREAMING = streaming
+            histograms[streaming] = LatencyHistogram()
+            packets[streaming] = []
+            boundaries[streaming] = []
+            for x in range(2 * generator.PACKETS_PER_SET + 1):
+                start = time.perf_counter()
+                packet = generator.PAVDataCollection()
+                latency = time.perf_counter() - start
+                histograms[streaming].record(latency)
+                packets[streaming].append(packet)
+                if x % generator.PACKETS_PER_SET == 0:
+                    boundaries[streaming].append(latency)
+
+        self.assertEqual(packets[True], packets[False])
+        self.assertEqual(histograms[True].count, 40001)
+        self.assertLess(max(boundaries[True]) * 5, min(boundaries[False]))
+        self.assertLessEqual(histograms[True].percentile(99), histograms[True].maximum)
+
+        generator = PAVDataGenerator(seed=7)
+        generator.STREAMING = True
+        generator.seekPacket(1234)
+        self.assertEqual(generator.PAVDataCollection(), [data[233] for data in PAVDataGenerator(seed=7).generateSet(2)] + [1234])
+
+    def testSetPipeline(self):
+
+        generator = PAVDataGenerator(seed=3)
+        generator.PACKETS_PER_SET = 50
+        codec = PAVJsonCodec(generator.channels)
+        expected = [codec.encode(generator.PAVDataCollection()) for x in range(400)]
+
+        generator = PAVDataGenerator(seed=3)
+        generator.PACKETS_PER_SET = 50
+        generator.seekPacket(21)
+        pipeline = PAVSetPipeline(generator, codec, depth=2)
+        pipeline.start()
+        self.assertEqual([pipeline.nextPacket() for x in range(150)], expected[20:170])
+
+        # the queue is bounded, so the worker stays at most depth sets (plus the one it holds) ahead
+        time.sleep(0.1)
+        self.assertLessEqual(generator.packetNumber, 170 + 30 + 3 * 50)
+
+        pipeline.stop()
+        self.assertEqual(generator.packetNumber, 170)
+        pipeline.start()
+        self.assertEqual([pipeline.nextPacket() for x in range(60)], expected[170:230])
+        pipeline.stop()
+
+        # a restart after the set size changed continues the same stream
+        config = PAVConfig()
+        restarted = PAVDataGenerator(seed=3)
+        restarted.PACKETS_PER_SET = 50
+        pipeline = PAVSetPipeline(restarted, codec, depth=2, config=config)
+        pipeline.start()
+        sent = [pipeline.nextPacket() for x in range(100)]
+        config.update(PACKETS_PER_SET=20)
+        sent.extend(pipeline.nextPacket() for x in range(200))
+        pipeline.stop()
+        pipeline.start()
+        sent.extend(pipeline.nextPacket() for x in range(100))
+        pipeline.stop()
+        origin = restarted.origins[1][0]
+        reference = PAVDataGenerator(seed=3)
+        reference.PACKETS_PER_SET = 50
+        continuous = [codec.encode(reference.PAVDataCollection()) for x in range(origin)]
+        reference.applySettings(config.settings(), 1)
+        continuous.extend(codec.encode(reference.PAVDataCollection()) for x in range(400 - origin))
+        self.assertEqual(sent, continuous)
+
+        class FailingCodec(PAVJsonCodec):
+            def encode(self, PAVGeneratedData):
+                if PAVGeneratedData[-1] > 320:
+                    raise TypeError("broken packet")
+                return PAVJsonCodec.encode(self, PAVGeneratedData)
+
+        pipeline = PAVSetPipeline(generator, FailingCodec(generator.channels), depth=2)
+        pipeline.start()
+        self.assertEqual([pipeline.nextPacket() for x in range(70)], expected[230:300])
+        self.assertRaises(TypeError, pipeline.nextPacket)
+        self.assertIsInstance(pipeline.error, TypeError)
+        pipeline.worker.join(1)
+        self.assertFalse(pipeline.worker.is_alive())
+        pipeline.stop()
+        self.assertEqual(generator.packetNumber, 300)
+
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1)
+        try:
+            broadcaster = GenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0, rate=2000, seed=3, pipelineDepth=2)
+            broadcaster.datagen.PACKETS_PER_SET = 50
+            broadcaster.start()
+            time.sleep(0.1)
+            broadcaster.stop()
+            sent = broadcaster.sender.packetsSent
+            self.assertGreater(sent, 50)
+            self.assertEqual([receiver.recv(500) for x in range(sent)], expected[:sent])
+            self.assertEqual(broadcaster.datagen.packetNumber, sent)
+        finally:
+            receiver.close()
+
+    def testJsonCodecMatchesJsonConversion(self):
+
+        broadcaster = GenerateAndBroadcast("127.0.0.1", 1111, 1)
+        for x in range(1000):
+            data = broadcaster.datagen.PAVDataCollection()
+            self.assertEqual(broadcaster.codec.encode(data), broadcaster.jsonConversion(data).encode("utf-8"))
+
+        # values the template can not format go through json.dumps
+        for data in ([float("nan"), 1.5, -0.0, 1e-07, 2.5, True, 3], [1, 2, 3, 4, 5, 6, 10 ** 20], [None, 1, 2, 3, 4, 5, 6]):
+            self.assertEqual(broadcaster.codec.encode(data), broadcaster.jsonConversion(data).encode("utf-8"))
+
+        broadcaster.datagen.addChannel(PAVChannel("voltageData"))
+        data = broadcaster.datagen.PAVDataCollection()
+        self.assertEqual(broadcaster.codec.encode(data), broadcaster.jsonConversion(data).encode("utf-8"))
+
+        broadcaster.resetPacketNumber()
+        data = broadcaster.datagen.PAVDataCollection()
+        self.assertEqual(broadcaster.codec.encode(data), broadcaster.jsonConversion(data).encode("utf-8"))
+
+        self.assertGreater(benchmarkJsonEncoding(2000)["speedup"], 1)
+
+    def testBinaryCodec(self):
+
+        broadcaster = GenerateAndBroadcast("127.0.0.1", 1111, 1, codec=PAVBinaryCodec(decimals=2))
+        jsonCodec = PAVJsonCodec(broadcaster.datagen.channels)
+        for x in range(100):
+            data = broadcaster.datagen.PAVDataCollection()
+            packet = broadcaster.codec.encode(data)
+            self.assertEqual(len(packet), 32)
+            self.assertEqual(broadcaster.codec.decode(packet), jsonCodec.decode(jsonCodec.encode(data)))
+
+        self.assertRaises(ValueError, broadcaster.codec.decode, b"XX" + packet[2:])
+        self.assertEqual(broadcaster.codec.decode(broadcaster.codec.encode(data[:-1] + [2 ** 32 + 5]))["packetNumber"], 5)
+        self.assertEqual(unwrapPacketNumber(5, 2 ** 32 - 2), 2 ** 32 + 5)
+        self.assertEqual(unwrapPacketNumber(2 ** 32 - 1, 2 ** 32 + 3), 2 ** 32 - 1)
+        self.assertEqual(unwrapPacketNumber(2 ** 40 + 7, 2 ** 40), 2 ** 40 + 7)
+        broadcaster.datagen.addChannel(PAVChannel("voltageData"))
+        self.assertEqual(len(broadcaster.codec.encode(broadcaster.datagen.PAVDataCollection())), 36)
+        self.assertRaises(ValueError, broadcaster.codec.decode, packet)
+
+    def testFleet(self):
+
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1)
+        try:
+            fleet = PAVFleet(4, "127.0.0.1", receiver.getsockname()[1], 100, workers=2, codecType=PAVBinaryCodec)
+            fleet.start()
+            time.sleep(0.3)
+            fleet.stop()
+
+            stats = fleet.stats()
+            self.assertEqual(sorted(stats["perVehicle"]), [0, 1, 2, 3])
+            for packetsSent in stats["perVehicle"].values():
+                self.assertGreater(packetsSent, 10)
+
+            codec = PAVBinaryCodec(PAVDataGenerator().channels)
+            packetNumbers = [codec.decode(receiver.recv(64))["packetNumber"] for x in range(stats["packetsSent"])]
+            self.assertEqual(sorted(packetNumbers), sorted(number for sent in stats["perVehicle"].values() for number in range(1, sent + 1)))
+            self.assertEqual(stats["sendErrors"], 0)
+        finally:
+            receiver.close()
+
+        # refused packets are counted, the workers keep sending
+        closed = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        closed.bind(("127.0.0.1", 0))
+        closedPort = closed.getsockname()[1]
+        closed.close()
+        fleet = PAVFleet(2, "127.0.0.1", closedPort, 200, workers=1)
+        fleet.start()
+        time.sleep(0.3)
+        fleet.stop()
+        stats = fleet.stats()
+        self.assertEqual(sorted(stats["perVehicle"]), [0, 1])
+        self.assertGreater(stats["sendErrors"], 10)
+        self.assertGreater(stats["packetsSent"] + stats["sendErrors"], 60)
+        self.assertGreater(stats["achievedRate"], 300)
+
+        fleet = PAVFleet(2, "no-such-host.invalid", 1111, 200, workers=2)
+        self.assertRaises(RuntimeError, fleet.start, 5)
+        self.assertEqual(fleet.processes, [])
+
+    def testAsyncBroadcast(self):
+
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1)
+
+        async def broadcast():
+            broadcaster = AsyncGenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0.005)
+            await broadcaster.start()
+            await asyncio.sleep(0.1)
+            await broadcaster.stop()
+            return broadcaster.datagen.packetNumber
+
+        async def collect():
+            broadcaster = AsyncGenerateAndBroadcast("127.0.0.1", 1111, 0)
+            return [packet async for packet in broadcaster.packets(3)]
+
+        try:
+            sent = asyncio.run(broadcast())
+            self.assertGreater(sent, 5)
+            for packetNumber in range(1, sent + 1):
+                self.assertEqual(json.loads(receiver.recv(500))["packetNumber"], packetNumber)
+
+            packets = [json.loads(packet) for packet in asyncio.run(collect())]
+            self.assertEqual([packet["packetNumber"] for packet in packets], [1, 2, 3])
+            self.assertEqual(list(packets[0]), list(json.loads(GenerateAndBroadcast("127.0.0.1", 1111, 1).codec.encode(PAVDataGenerator().PAVDataCollection()))))
+        finally:
+            receiver.close()
+
+    def testRateScheduler(self):
+
+        self.assertRaises(ValueError, RateScheduler, 0.5)
+        self.assertRaises(ValueError, RateScheduler, 200000)
+
+        scheduler = RateScheduler(1000)
+        ticks = 0
+        while ticks < 200:
+            ticks = ticks + scheduler.wait()
+            time.sleep(0.0002)  # work between waits must not slow the rate down
+        stats = scheduler.stats()
+        self.assertGreater(stats["achievedRate"], 900)
+        self.assertLess(stats["achievedRate"], 1100)
+
+        bursts = stats["bursts"]
+        time.sleep(0.02)  # stall for about 20 ticks
+        self.assertGreaterEqual(scheduler.wait(), 15)
+        self.assertEqual(scheduler.stats()["bursts"], bursts + 1)
+
+        scheduler = RateScheduler(1000, maxBurst=3)
+        time.sleep(0.02)
+        self.assertEqual(scheduler.wait(), 3)
+        self.assertGreaterEqual(scheduler.stats()["skipped"], 15)
+
+        killer = threading.Event()
+        killer.set()
+        self.assertEqual(RateScheduler(1).wait(killer), 0)
+
+    def testUDPSenderBatching(self):
+
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1)
+        try:
+            for useSendmmsg in set([False, _sendmmsg is not None]):
+                sender = UDPSender("127.0.0.1", receiver.getsockname()[1], batchSize=8, flushInterval=60)
+                sender.useSendmmsg = useSendmmsg
+                for index in range(20):
+                    sender.send(str(index).encode("utf-8"))
+                self.assertEqual(len(sender.pending), 4)
+                sender.close()
+
+                self.assertEqual([receiver.recv(64) for x in range(20)], [str(index).encode("utf-8") for index in range(20)])
+                self.assertEqual(sender.packetsSent, 20)
+                self.assertEqual(sender.bytesSent, 30)
+                if useSendmmsg:
+                    self.assertEqual(sender.sendCalls, 3)
+
+            # a queued datagram is flushed before the thread blocks past its flushInterval
+            sender = UDPSender("127.0.0.1", receiver.getsockname()[1], batchSize=8, flushInterval=0.05)
+            sender.send(b"a")
+            sender.flushBefore(time.perf_counter() + 0.01)
+            self.assertEqual(sender.pending, [b"a"])
+            sender.flushBefore(time.perf_counter() + 0.1)
+            self.assertEqual(sender.pending, [])
+            self.assertEqual(receiver.recv(64), b"a")
+            sender.close()
+
+            # and the broadcast does so while it waits for the next packet, instead of holding it until the next send
+            broadcaster = GenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0.3, batchSize=8, flushInterval=0.01, seed=1)
+            start = time.perf_counter()
+            broadcaster.start()
+            try:
+                self.assertEqual(json.loads(receiver.recv(2048))["packetNumber"], 1)
+                self.assertLess(time.perf_counter() - start, 0.5)
+            finally:
+                broadcaster.stop()
+        finally:
+            receiver.close()
+
+    def testStats(self):
+
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        for pipelineDepth in (None, 2):
+            broadcaster = GenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0, rate=2000, seed=3, pipelineDepth=pipelineDepth)
+            broadcaster.datagen.PACKETS_PER_SET = 100
+            broadcaster.statistics.sampleEvery = 1
+            server = broadcaster.serveStats(0)
+            broadcaster.start()
+            time.sleep(0.3)
+            broadcaster.stop()
+
+            stats = broadcaster.stats()
+            self.assertGreater(stats["packetsSent"], 100)
+            self.assertEqual(stats["sendErrors"], 0)
+            self.assertEqual(stats["packetsSent"], stats["sender"]["packetsSent"])
+            self.assertEqual(stats["bytesSent"], stats["sender"]["bytesSent"])
+            self.assertGreaterEqual(stats["setsGenerated"], stats["packetsSent"] // 100)
+            self.assertEqual(stats["targetRate"], 2000)
+            self.assertGreater(stats["achievedRate"], 1000)
+            self.assertEqual(stats["stages"]["send"]["count"], stats["packetsSent"])
+            self.assertGreater(stats["stages"]["generate"]["count"], 0)
+            self.assertGreater(stats["stages"]["encode"]["count"], 0)
+
+            metrics = urllib.request.urlopen("http://127.0.0.1:%d/metrics" % server.server_address[1]).read().decode("utf-8")
+            self.assertIn("pav_packets_sent_total %d\n" % stats["packetsSent"], metrics)
+            self.assertIn('pav_stage_seconds_count{stage="send"} %d\n' % stats["packetsSent"], metrics)
+            served = json.loads(urllib.request.urlopen("http://127.0.0.1:%d/stats" % server.server_address[1]).read().decode("utf-8"))
+            self.assertEqual(served["packetsSent"], stats["packetsSent"])
+            broadcaster.stopServingStats()
+            self.assertIsNone(broadcaster.statsServer)
+        receiver.close()
+
+    def testRecordAndReplay(self):
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "flight.pavlog")
+        codec = PAVBinaryCodec()
+        recorder = PAVRecorder(path)
+        recorder.recordGenerated(PAVDataGenerator(seed=5), codec, 200, 1000)
+        recorder.close()
+        recorder = PAVRecorder(path)  # appends
+        recorder.record(b"last", 0.2)
+        recorder.close()
+        with open(path, "ab") as log:
+            log.write(PAVRecorder.RECORD.pack(0.3, 100) + b"cut short")
+
+        generator = PAVDataGenerator(seed=5)
+        expected = [codec.encode(generator.PAVDataCollection()) for x in range(200)] + [b"last"]
+        replayer = PAVReplayer(path)
+        self.assertEqual(replayer.count(), 201)
+        self.assertEqual([bytes(payload) for timestamp, payload in replayer.records()], expected)
+        self.assertAlmostEqual(list(replayer.records())[100][0], 0.1)
+
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        receiver.settimeout(1)
+        for speed, batchSize, shortest, longest in ((2, 1, 0.095, 0.3), (None, 8, 0.0, 0.1)):
+            sender = UDPSender("127.0.0.1", receiver.getsockname()[1], batchSize)
+            start = time.perf_counter()
+            self.assertEqual(replayer.replay(sender, speed), 201)
+            elapsed = time.perf_counter() - start
+            sender.close()
+            self.assertTrue(shortest <= elapsed <= longest, elapsed)
+            self.assertEqual([receiver.recv(2048) for x in range(201)], expected)
+        replayer.close()
+
+        with open(os.path.join(directory, "other"), "wb") as other:
+            other.write(b"JUNK" + bytes(20))
+        self.assertRaises(ValueError, PAVReplayer, os.path.join(directory, "other"))
+        self.assertRaises(ValueError, PAVRecorder, os.path.join(directory, "other"))
+
+        recorder = PAVRecorder(os.path.join(directory, "live.pavlog"))
+        broadcaster = GenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0, rate=1000, seed=5, codec=PAVBinaryCodec(), recorder=recorder)
+        broadcaster.start()
+        time.sleep(0.1)
+        broadcaster.stop()
+        recorder.close()
+        replayer = PAVReplayer(os.path.join(directory, "live.pavlog"))
+        self.assertEqual(replayer.count(), broadcaster.stats()["packetsSent"])
+        self.assertEqual(bytes(next(replayer.records())[1]), expected[0])
+        replayer.close()
+        receiver.close()
+        shutil.rmtree(directory)
+
+    def testFanOut(self):
+
+        receivers = []
+        for x in range(3):
+            receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            receiver.bind(("127.0.0.1", 0))
+            receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            receiver.settimeout(0.5)
+            receivers.append(receiver)
+        ports = [receiver.getsockname()[1] for receiver in receivers]
+
+        def received(receiver):
+            packets = []
+            try:
+                while True:
+                    packets.append(json.loads(receiver.recv(2048).decode("utf-8")))
+            except socket.timeout:
+                return packets
+
+        broadcaster = GenerateAndBroadcast("127.0.0.1", ports[0], 0, rate=1000, seed=9)
+        broadcaster.addDestination("127.0.0.1", ports[1])
+        broadcaster.start()
+        time.sleep(0.1)
+        broadcaster.addDestination("127.0.0.1", ports[2])
+        time.sleep(0.1)
+        self.assertTrue(broadcaster.removeDestination("127.0.0.1", ports[0]))
+        self.assertFalse(broadcaster.removeDestination("127.0.0.1", ports[0]))
+        time.sleep(0.1)
+        broadcaster.stop()
+
+        packets = [received(receiver) for receiver in receivers]
+        numbers = [[packet["packetNumber"] for packet in receiverPackets] for receiverPackets in packets]
+        self.assertEqual(numbers[1], list(range(1, broadcaster.datagen.packetNumber + 1)))
+        self.assertEqual(numbers[0], numbers[1][:len(numbers[0])])
+        self.assertEqual(numbers[2], numbers[1][-len(numbers[2]):])
+        self.assertTrue(0 < len(numbers[0]) < len(numbers[1]) and 0 < len(numbers[2]) < len(numbers[1]))
+        self.assertEqual(packets[2], packets[1][-len(packets[2]):])
+        self.assertEqual(broadcaster.stats()["sender"]["packetsSent"], sum(len(receiverNumbers) for receiverNumbers in numbers))
+        # in the order they were added, the ports the kernel picked need not be ascending
+        self.assertEqual(list(broadcaster.destinations), [("127.0.0.1", ports[1]), ("127.0.0.1", ports[2])])
+
+        # a destination nobody listens on does not stop the others
+        closedPort = receivers[0].getsockname()[1]
+        receivers[0].close()
+        fanOut = UDPFanOut()
+        fanOut.addDestination("127.0.0.1", closedPort)
+        fanOut.addDestination("127.0.0.1", ports[1])
+        self.assertEqual(len(fanOut.destinations()), 2)
+        for index in range(20):
+            fanOut.send(("%d" % index).encode("utf-8"))
+        fanOut.close()
+        self.assertGreater(fanOut.sendErrors, 0)
+        self.assertEqual([receivers[1].recv(64) for x in range(20)], [("%d" % index).encode("utf-8") for index in range(20)])
+        self.assertRaises(ValueError, fanOut.addDestination, "127.0.0.1", ports[2])
+        for receiver in receivers[1:]:
+            receiver.close()
+
+        sender = UDPSender("239.255.42.99", 5005, multicastTTL=3, multicastLoop=False)
+        self.assertTrue(sender.isMulticast)
+        self.assertEqual(sender.sock.getsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL), 3)
+        self.assertEqual(sender.sock.getsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP), 0)
+        sender.close()
+        sender = UDPSender("127.0.0.1", 5005)
+        self.assertFalse(sender.isMulticast)
+        sender.close()
+
+    def testBackpressure(self):
+
+        # a datagram socket pair nobody reads from fills up, the sends that find it full are dropped
+        for batchSize in (1, 16):
+            sender = UDPSender("127.0.0.1", 9, batchSize, flushInterval=60, sendBufferSize=65536, blocking=False)
+            self.assertGreaterEqual(sender.sendBufferSize, 65536)
+            sender.sock.close()
+            sender.sock, reader = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.sock.setblocking(False)
+            for index in range(2000):
+                sender.send(b"x" * 512)
+            sender.flush()
+            self.assertGreater(sender.drops, 0)
+            self.assertEqual(sender.packetsSent + sender.drops, 2000)
+            self.assertEqual(sender.losses(), sender.drops)
+            sender.close()
+            reader.close()
+
+        scheduler = RateScheduler(1000)
+        while scheduler.ticks < 50:
+            scheduler.wait()
+        scheduler.setRate(100)
+        self.assertEqual(scheduler.wait(), 1)
+        start = time.perf_counter()
+        while scheduler.ticks < 55:
+            scheduler.wait()
+        self.assertAlmostEqual(time.perf_counter() - start, 0.04, delta=0.015)
+
+        # a slow receiver loses packets, its acks make the rate back off
+        receiver = PAVReceiver(ackInterval=0.01, processingDelay=0.0005, receiveBufferSize=4096)
+        receiver.start()
+        broadcaster = GenerateAndBroadcast(receiver.address[0], receiver.address[1], 0, rate=20000, seed=1, minRate=100)
+        broadcaster.rateController.interval = 0.05
+        broadcaster.start()
+        time.sleep(0.6)
+        broadcaster.stop()
+        receiver.stop()
+        stats = broadcaster.stats()
+        self.assertGreater(stats["rateController"]["decreases"], 0)
+        self.assertLess(stats["rateController"]["rate"], 20000)
+        self.assertGreater(stats["sender"]["losses"], 0)
+        self.assertGreater(receiver.acksSent, 0)
+        self.assertEqual(receiver.packetsReceived + receiver.lost(), max(peer.highest for peer in receiver.peers.values()))
+
+        # a stall only delays the newest packet when coalescing
+        class StallingCodec(PAVJsonCodec):
+            def encode(self, PAVGeneratedData):
+                if PAVGeneratedData[-1] % 100 == 0:
+                    time.sleep(0.02)
+                return PAVJsonCodec.encode(self, PAVGeneratedData)
+
+        receiver = PAVReceiver(ackInterval=0.01)
+        receiver.start()
+        broadcaster = GenerateAndBroadcast(receiver.address[0], receiver.address[1], 0, rate=2000, seed=1, codec=StallingCodec(), coalesce=True)
+        broadcaster.start()
+        time.sleep(0.4)
+        broadcaster.stop()
+        time.sleep(0.05)
+        receiver.stop()
+        stats = broadcaster.stats()
+        self.assertGreater(stats["packetsCoalesced"], 0)
+        self.assertEqual(stats["packetsSent"] + stats["packetsCoalesced"], broadcaster.datagen.packetNumber)
+        self.assertEqual(receiver.packetsReceived, stats["packetsSent"])
+        self.assertEqual(receiver.lost(), stats["packetsCoalesced"])
+
+    def testHotConfig(self):
+
+        config = PAVConfig({"MAX_AIRSPEED": 40})
+        self.assertEqual(config.state, (1, {"MAX_AIRSPEED": 40}))
+        for bad in ({"MAX_SPEED": 1}, {"CHANNELS": []}, {"STREAMING": 1}, {"PACKETS_PER_SET": 0}, {"PACKETS_PER_SET": 2.5},
+                    {"PACKETS_PER_SET": 50.0}, {"NUM_DECIMALS": 2.0}, {"MIN_FAN": "3"}, {"rate": 0}, {"delay": -1}, {"MIN_FAN": 3, "isPrinting": True}):
+            self.assertRaises(ValueError, config.update, bad)
+        self.assertEqual(config.state, (1, {"MAX_AIRSPEED": 40}))
+        self.assertEqual(PAVDataGenerator.MAX_AIRSPEED, 30)
+
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        receiver.settimeout(0.5)
+        for pipelineDepth in (None, 2):
+            config = PAVConfig({"PACKETS_PER_SET": 20})
+            broadcaster = GenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0, rate=2000, seed=2, pipelineDepth=pipelineDepth, config=config)
+            broadcaster.start()
+            time.sleep(0.1)
+            version = config.update(MIN_AIRSPEED=100, MAX_AIRSPEED=101, PACKETS_PER_SET=50)
+            time.sleep(0.1)
+            config.update(rate=500)
+            time.sleep(0.1)
+            sentBefore = broadcaster.statistics.packetsSent
+            time.sleep(0.2)
+            sentAfter = broadcaster.statistics.packetsSent
+            broadcaster.stop()
+
+            packets = []
+            try:
+                while True:
+                    packets.append(json.loads(receiver.recv(2048).decode("utf-8")))
+            except socket.timeout:
+                pass
+            self.assertEqual([packet["packetNumber"] for packet in packets], list(range(1, len(packets) + 1)))
+            speeds = [packet["speedData"] for packet in packets]
+            changed = min(index for index, speed in enumerate(speeds) if speed >= 100)
+            self.assertLessEqual(max(speeds[:changed]), 30)
+            self.assertTrue(all(100 <= speed <= 101 for speed in speeds[changed:]))
+            self.assertEqual(changed % 20, 0)
+            self.assertAlmostEqual(sentAfter - sentBefore, 100, delta=25)
+            self.assertEqual(broadcaster.datagen.PACKETS_PER_SET, 50)
+            self.assertEqual(PAVDataGenerator.MAX_AIRSPEED, 30)
+
+        config = PAVConfig()
+        broadcaster = GenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0, rate=2000, minRate=100, seed=2, config=config)
+        broadcaster.start()
+        time.sleep(0.1)
+        config.update(rate=200)
+        time.sleep(0.05)
+        sentBefore = broadcaster.statistics.packetsSent
+        time.sleep(0.3)
+        sentAfter = broadcaster.statistics.packetsSent
+        broadcaster.stop()
+        self.assertAlmostEqual(sentAfter - sentBefore, 60, delta=15)
+        self.assertEqual(broadcaster.rateController.maxRate, 200)
+        self.assertRaises(ValueError, config.update, delay=0.5)
+
+        delayed = GenerateAndBroadcast("127.0.0.1", receiver.getsockname()[1], 0.01, config=PAVConfig({"MAX_FAN": 20}))
+        self.assertRaises(ValueError, delayed.config.update, rate=100)
+        self.assertEqual(delayed.config.update(delay=0.5), 2)
+        self.assertRaises(ValueError, GenerateAndBroadcast, "127.0.0.1", 1111, 0.01, config=PAVConfig({"rate": 100}))
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "settings.json")
+        with open(path, "w") as settings:
+            json.dump({"MAX_FAN": 20}, settings)
+        config = PAVConfig()
+        config.watchFile(path, interval=0.02)
+        self.assertEqual(config.settings(), {"MAX_FAN": 20})
+        time.sleep(0.05)
+        with open(path, "w") as settings:
+            json.dump({"MAX_FAN": 25, "rate": 100}, settings)
+        os.utime(path, ns=(time.time_ns() + 10 ** 9, time.time_ns() + 10 ** 9))
+        deadline = time.time() + 2
+        while config.settings().get("MAX_FAN") != 25 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(config.settings(), {"MAX_FAN": 25, "rate": 100})
+
+        control = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        control.settimeout(1)
+        address = config.serveControl()
+        control.sendto(b'{"MIN_FAN": 5}', address)
+        reply = json.loads(control.recv(4096).decode("utf-8"))
+        self.assertEqual(reply["settings"], {"MAX_FAN": 25, "MIN_FAN": 5, "rate": 100})
+        self.assertEqual(reply["version"], config.state[0])
+        control.sendto(b'{"MIN_FAN": "five"}', address)
+        self.assertIn("error", json.loads(control.recv(4096).decode("utf-8")))
+        control.sendto(b'{"NUM_DECIMALS": 2.0}', address)
+        self.assertIn("error", json.loads(control.recv(4096).decode("utf-8")))
+        control.sendto(b'not json', address)
+        self.assertIn("error", json.loads(control.recv(4096).decode("utf-8")))
+        control.close()
+        config.stop()
+        receiver.close()
+        shutil.rmtree(directory)
+
+    def testReceiver(self):
+
+        datagen = PAVDataGenerator(seed=3)
+        data = datagen.PAVDataCollection()
+        for codec in (PAVJsonCodec(datagen.channels, sendTimes=True), PAVBinaryCodec(datagen.channels, sendTimes=True)):
+            before = time.time()
+            payload = codec.encode(data)
+            decoded = codec.decode(payload)
+            self.assertEqual(decoded["packetNumber"], data[-1])
+            self.assertTrue(before - 1e-6 <= decoded["sendTime"] <= time.time() + 1e-6)
+            time.sleep(0.01)
+            stamped = codec.stamp(payload)
+            self.assertEqual(len(stamped), len(payload))
+            self.assertGreater(codec.decode(stamped)["sendTime"], decoded["sendTime"] + 0.005)
+            del decoded["sendTime"]
+            self.assertEqual(decoded, PAVBinaryCodec(datagen.channels).decode(PAVBinaryCodec(datagen.channels).encode(data))
+                             if isinstance(codec, PAVBinaryCodec) else json.loads(PAVJsonCodec(datagen.channels).encode(data)))
+        self.assertEqual(PAVJsonCodec(datagen.channels).stamp(b"{}"), b"{}")
+
+        peer = PAVPeerStats(1, reorderWindow=4)
+        for packetNumber in (2, 3, 5, 4, 4, 8, 6, 20, 10, 15):
+            peer.add(packetNumber)
+        self.assertEqual(peer.summary(), {"first": 1, "highest": 20, "received": 11, "lost": 10, "gaps": 3, "reordered": 4, "duplicates": 1})
+        peer = PAVPeerStats(5)
+        for packetNumber in (4, 3, 1, 2):
+            peer.add(packetNumber)
+        self.assertEqual(peer.summary(), {"first": 1, "highest": 5, "received": 5, "lost": 0, "gaps": 1, "reordered": 4, "duplicates": 0})
+        peer = PAVPeerStats(20, reorderWindow=4)
+        for packetNumber in (10, 12, 18, 19, 18):
+            peer.add(packetNumber)
+        self.assertEqual(peer.summary(), {"first": 10, "highest": 20, "received": 6, "lost": 6, "gaps": 1, "reordered": 4, "duplicates": 1})
+
+        codec = PAVJsonCodec(datagen.channels)
+        binaryCodec = PAVBinaryCodec(datagen.channels, sendTimes=True)
+        for useRecvmmsg in (True, False):
+            packets = []
+            receiver = PAVReceiver(batchSize=4, onPacket=lambda packet, address: packets.append(packet["packetNumber"]))
+            receiver.useRecvmmsg = useRecvmmsg and receiver.useRecvmmsg
+            sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            for packetNumber in (1, 2, 4, 3, 3, 6):
+                sender.sendto(codec.encode(list(data[:-1]) + [packetNumber]), receiver.address)
+            sender.sendto(b"not a packet", receiver.address)
+            sender.sendto(binaryCodec.encode(list(data[:-1]) + [7]), receiver.address)
+            deadline = time.time() + 2
+            while receiver.packetsReceived < 8 and time.time() < deadline:
+                receiver.poll(0.1)
+            report = receiver.report()
+            self.assertEqual(packets, [1, 2, 4, 3, 3, 6, 7])
+            self.assertEqual(report["packetsReceived"], 8)
+            self.assertEqual(report["invalid"], 1)
+            self.assertEqual((report["lost"], report["reordered"], report["duplicates"]), (1, 1, 1))
+            self.assertEqual(report["latency"]["count"], 1)
+            self.assertEqual(list(report["peers"]), ["127.0.0.1:%d" % sender.getsockname()[1]])
+            self.assertEqual(report["recvCalls"], 2 if receiver.useRecvmmsg else 8)
+            sender.close()
+            receiver.sock.close()
+
+        # binary packet numbers wrap around to 0 after 2^32 - 1, the receiver and the acks carry on past it
+        packets = []
+        receiver = PAVReceiver(ackInterval=0.01, onPacket=lambda packet, address: packets.append(packet["packetNumber"]))
+        receiver.start()
+        sender = UDPSender(*receiver.address)
+        for packetNumbers in (range(2 ** 32 - 3, 2 ** 32), range(2 ** 32, 2 ** 32 + 3)):
+            for packetNumber in packetNumbers:
+                sender.send(binaryCodec.encode(list(data[:-1]) + [packetNumber]))
+            deadline = time.time() + 2
+            while sender.ackedPacketNumber < packetNumber and time.time() < deadline:
+                time.sleep(0.01)
+                sender.pollAcks()
+        receiver.stop()
+        sender.close()
+        self.assertEqual(packets, list(range(2 ** 32 - 3, 2 ** 32 + 3)))
+        self.assertEqual(receiver.lost(), 0)
+        self.assertEqual(sender.ackedPacketNumber, 2 ** 32 + 2)
+
+        for codec in (PAVJsonCodec(sendTimes=True), PAVBinaryCodec(sendTimes=True)):
+            receiver = PAVReceiver()
+            receiver.start()
+            broadcaster = GenerateAndBroadcast("127.0.0.1", receiver.address[1], 0, batchSize=8, rate=5000, seed=1, codec=codec, pipelineDepth=2)
+            broadcaster.start()
+            time.sleep(0.3)
+            broadcaster.stop()
+            receiver.stop()
+            report = receiver.report()
+            self.assertEqual(report["packetsReceived"], broadcaster.statistics.packetsSent)
+            self.assertEqual((report["lost"], report["reordered"], report["duplicates"], report["invalid"]), (0, 0, 0, 0))
+            self.assertEqual(report["latency"]["count"], report["packetsReceived"])
+            self.assertLess(report["latency"]["p50"], 0.1)
+            self.assertGreater(report["packetsPerSecond"], 2500)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testExportDataset(self):
+
+        directory = tempfile.mkdtemp()
+        datagen = PAVDataGenerator(seed=11)
+        datagen.PACKETS_PER_SET = 100
+        datagen.addChannel(PAVChannel("extraData", 5, 10, decimals=1))
+        stream = PAVDataGenerator(seed=11)
+        stream.PACKETS_PER_SET = 100
+        stream.USE_BATCH_ENGINE = True
+        stream.addChannel(PAVChannel("extraData", 5, 10, decimals=1))
+        expected = numpy.array([stream.PAVDataCollection() for x in range(2550)])
+
+        for format, workers in (("npz", 2), ("npy", 1), ("csv", 3)):
+            prefix = os.path.join(directory, "export-%s" % format)
+            description = exportDataset(prefix, 2550, format, chunkRows=1050, workers=workers, datagen=datagen)
+            self.assertEqual(description["chunkRows"], 1000)
+            self.assertEqual(len(description["chunks"]), 3)
+            self.assertEqual(description["columns"][-2:], ["extraData", "packetNumber"])
+            columns = loadDataset(prefix)
+            self.assertEqual(list(columns["packetNumber"]), list(range(1, 2551)))
+            for index, name in enumerate(description["columns"]):
+                numpy.testing.assert_allclose(columns[name], expected[:, index], err_msg=name)
+        self.assertEqual(datagen.packetNumber, 0)
+
+        exportDataset(os.path.join(directory, "loop"), 150, "npz", chunkRows=100, workers=1, seed=11, useBatchEngine=False)
+        stream = PAVDataGenerator(seed=11)
+        numpy.testing.assert_allclose(loadDataset(os.path.join(directory, "loop"))["fanData"], [stream.PAVDataCollection()[5] for x in range(150)])
+        self.assertRaises(ValueError, exportDataset, os.path.join(directory, "bad"), 10, "parquet")
+
+        # a generator that is streaming holds live generators, the workers get a snapshot of it
+        streaming = PAVDataGenerator(seed=11)
+        streaming.STREAMING = True
+        streaming.PACKETS_PER_SET = 100
+        streaming.PAVDataCollection()
+        exportDataset(os.path.join(directory, "streaming"), 250, "npz", chunkRows=100, workers=2, datagen=streaming)
+        numpy.testing.assert_allclose(loadDataset(os.path.join(directory, "streaming"))["packetNumber"], range(1, 251))
+        self.assertEqual(streaming.packetNumber, 1)
+
+        exportDataset(os.path.join(directory, "empty"), 0, "csv", workers=2)
+        self.assertEqual(dict((name, len(values)) for name, values in loadDataset(os.path.join(directory, "empty")).items()),
+                         dict((channel.name, 0) for channel in PAVDataGenerator.CHANNELS + [PAVChannel("packetNumber")]))
+        shutil.rmtree(directory)
+
+
+
 
-    
 
-   
             
 if __name__ == '__main__':
 
+    if sys.argv[1:2] == ["receive"]:
+        sys.exit(receiverMain(sys.argv[2:]))
+
     port = 1111
     delayBetweenPacketsSeconds = 1
     gen = GenerateAndBroadcast("192.168.1.1",port,delayBetweenPacketsSeconds)
-    gen.MAX_AIRSPEED = 30
+    gen.config.update(MAX_AIRSPEED=30)
     # Or set the constants in the code they are static and all have defaults
+    # settings can be changed the same way while it runs, they apply from the next set on
     gen.start()
     # generates in its own thread, you can continue to use the main thread while it running
     gen.isPrinting = True;
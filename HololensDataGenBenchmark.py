@@ -0,0 +1,259 @@
+"""
+Benchmark suite and regression harness for the PAV data generator
+Description: Measures the throughput and latency percentiles of every stage of HololensDataGen
+(per channel generation, PAVDataCollection, JSON conversion and end to end UDP sends to a local sink)
+for several set sizes and rates, writes the results as JSON and compares them against a stored baseline.
+The sends are measured flat out (the most the broadcaster can send) and paced at each rate (whether it keeps up with it).
+
+Usage: python HololensDataGenBenchmark.py --output results.json --baseline baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import unittest
+
+from HololensDataGen import GenerateAndBroadcast, LatencyHistogram, PAVDataGenerator, PAVJsonCodec, PAVReceiver, benchmarkJsonEncoding
+
+
+REPEAT = 5
+
+GENERATION_METHODS = [
+    "batteryDataGeneration",
+    "altitudeDataGeneration",
+    "headingDataGeneration",
+    "temperatureDataGeneration",
+    "fanRPMDataGeneration",
+    "airspeedDataGeneration",
+    ]
+
+
+
+def timeCalls(function, calls, itemsPerCall=1, repeat=REPEAT):
+    """
+    Calls function calls times, recording the latency of every call, and does so repeat times
+    Like timeit, the best round gives the throughput since slower rounds only measure interference
+    @param itemsPerCall: The number of items (values, packets) each call produces, for the throughput
+    @return: A result dict with the throughput (items per second) and the latency summary of LatencyHistogram over all rounds
+    """
+
+    for x in range(min(calls, 100)):
+        function()  # warm up, not timed
+
+    histogram = LatencyHistogram()
+    best = None
+    for round in range(repeat):
+        start = time.perf_counter()
+        for x in range(calls):
+            callStart = time.perf_counter()
+            function()
+            histogram.record(time.perf_counter() - callStart)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    result = histogram.summary()
+    result["throughput"] = calls * itemsPerCall / best
+    return result
+
+
+def benchmarkGeneration(packetsPerSet, sets):
+    """
+    Benchmarks every *DataGeneration method, the throughput is in values per second
+    """
+
+    generator = PAVDataGenerator(seed=1)
+    generator.PACKETS_PER_SET = packetsPerSet
+    results = {}
+    for method in GENERATION_METHODS:
+        results["generation.%s.pps%d" % (method, packetsPerSet)] = timeCalls(getattr(generator, method), max(10, sets), packetsPerSet)
+    return results
+
+
+def benchmarkCollection(packetsPerSet, packets):
+    """
+    Benchmarks PAVDataCollection in set and streaming mode, the throughput is in packets per second
+    """
+
+    results = {}
+    for streaming in (False, True):
+        generator = PAVDataGenerator(seed=1)
+        generator.PACKETS_PER_SET = packetsPerSet
+        generator.STREAMING = streaming
+        name = "collection.%s.pps%d" % ("streaming" if streaming else "set", packetsPerSet)
+        results[name] = timeCalls(generator.PAVDataCollection, packets)
+    return results
+
+
+def benchmarkEncoding(packets, repeat=REPEAT):
+    """
+    Benchmarks jsonConversion against PAVJsonCodec with HololensDataGen.benchmarkJsonEncoding, the throughput is in packets per second
+    """
+
+    run = benchmarkJsonEncoding(packets, repeat)
+    results = {}
+    for path in ("jsonConversion", "codec"):
+        results["encoding.%s" % path] = dict(run["%sLatency" % path], throughput=run["%sPerSecond" % path])
+    return results
+
+
+def benchmarkSend(rate, duration, packetsPerSet):
+    """
+    Broadcasts (JSON with send times) to a loopback PAVReceiver for duration seconds, at rate or flat out when rate is None
+    The throughput is the packet rate the broadcaster achieved: the most it can send flat out, and at a rate
+    the rate it kept up, so it only drops below the baseline when the broadcaster falls behind (targetFraction below 1).
+    latencyP50 and latencyP99 are the one way latencies the receiver measured, at a rate mean and max are the scheduler jitter
+    """
+
+    sink = PAVReceiver("127.0.0.1", 0)
+    broadcaster = GenerateAndBroadcast("127.0.0.1", sink.address[1], 0, rate=rate, seed=1, codec=PAVJsonCodec(sendTimes=True))
+    broadcaster.datagen.PACKETS_PER_SET = packetsPerSet
+    sink.start()
+    broadcaster.start()
+    time.sleep(duration)
+    broadcaster.stop()
+    time.sleep(0.05)  # let the sink read what is still in flight
+    sink.stop()
+
+    statistics = broadcaster.statistics.snapshot()
+    sent = statistics["packetsSent"]
+    received = sink.report()
+    result = {
+        "throughput": statistics["achievedRate"],
+        "sent": sent,
+        "received": received["packetsReceived"],
+        "loss": (sent - received["packetsReceived"]) / float(sent) if sent else 0.0,
+        "lost": received["lost"],
+        "reordered": received["reordered"],
+        "latencyP50": received["latency"]["p50"],
+        "latencyP99": received["latency"]["p99"],
+        }
+    if rate is None:
+        return {"send.max.pps%d" % packetsPerSet: result}
+
+    scheduler = broadcaster.scheduler.stats()
+    result.update({
+        "targetRate": rate,
+        "targetFraction": statistics["achievedRate"] / rate,
+        "mean": scheduler["jitterMean"],
+        "max": scheduler["jitterMax"],
+        })
+    return {"send.rate%d.pps%d" % (rate, packetsPerSet): result}
+
+
+def runBenchmarks(packetsPerSetValues=(500, 5000), rates=(1000, 10000), duration=1.0, packets=20000):
+    """
+    Runs the whole suite
+    @return: A dict with the run metadata and one result per benchmark name
+    """
+
+    results = {}
+    for packetsPerSet in packetsPerSetValues:
+        results.update(benchmarkGeneration(packetsPerSet, max(1, packets // packetsPerSet)))
+        results.update(benchmarkCollection(packetsPerSet, packets))
+    results.update(benchmarkEncoding(packets))
+    for rate in (None,) + tuple(rates):
+        results.update(benchmarkSend(rate, duration, packetsPerSetValues[0]))
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+        "results": results,
+        }
+
+
+def compareToBaseline(current, baseline, threshold=0.2):
+    """
+    Finds the benchmarks whose throughput dropped more than threshold (a fraction) below the baseline
+    Benchmarks missing from either run are ignored
+    @return: A list of (name, baseline throughput, current throughput) for every regression
+    """
+
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        if name not in baseline["results"]:
+            continue
+        expected = baseline["results"][name]["throughput"]
+        if result["throughput"] < expected * (1.0 - threshold):
+            regressions.append((name, expected, result["throughput"]))
+    return regressions
+
+
+def main(arguments=None):
+    """
+    Command line entry point, returns 1 when a regression was found
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the PAV data generator")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to the --baseline file instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed throughput drop as a fraction (default 0.2)")
+    parser.add_argument("--packets-per-set", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--rates", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per send benchmark")
+    parser.add_argument("--packets", type=int, default=20000, help="packets per generation and encoding benchmark")
+    options = parser.parse_args(arguments)
+
+    current = runBenchmarks(options.packets_per_set, options.rates, options.duration, options.packets)
+    for name, result in sorted(current["results"].items()):
+        p99 = result.get("p99", result.get("latencyP99"))
+        if p99 is None:
+            print("%-50s %14.1f/s" % (name, result["throughput"]))
+        else:
+            print("%-50s %14.1f/s  p99 %10.1fus" % (name, result["throughput"], p99 * 1e6))
+
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(current, output, indent=2, sort_keys=True)
+
+    if options.baseline and options.save_baseline:
+        with open(options.baseline, "w") as output:
+            json.dump(current, output, indent=2, sort_keys=True)
+    elif options.baseline:
+        with open(options.baseline) as stored:
+            regressions = compareToBaseline(current, json.load(stored), options.threshold)
+        for name, expected, measured in regressions:
+            print("REGRESSION %s: %.1f/s, baseline %.1f/s" % (name, measured, expected))
+        if regressions:
+            return 1
+        print("No regressions beyond %d%%" % (options.threshold * 100))
+    return 0
+
+
+
+class BenchmarkTests(unittest.TestCase):
+
+    def testCompareToBaseline(self):
+
+        baseline = {"results": {"a": {"throughput": 100.0}, "b": {"throughput": 100.0}, "c": {"throughput": 100.0}}}
+        current = {"results": {"a": {"throughput": 95.0}, "b": {"throughput": 80.0}, "d": {"throughput": 1.0}}}
+        self.assertEqual(compareToBaseline(current, baseline, 0.1), [("b", 100.0, 80.0)])
+        self.assertEqual(compareToBaseline(current, baseline, 0.25), [])
+
+    def testSmallRun(self):
+
+        current = runBenchmarks((50,), (500,), 0.2, 200)
+        results = current["results"]
+        self.assertIn("generation.airspeedDataGeneration.pps50", results)
+        self.assertIn("collection.streaming.pps50", results)
+        self.assertIn("encoding.codec", results)
+        self.assertGreater(results["encoding.codec"]["throughput"], results["encoding.jsonConversion"]["throughput"])
+        for path in ("jsonConversion", "codec"):
+            self.assertEqual(results["encoding.%s" % path]["count"], 200 * REPEAT)
+            self.assertIn("p99", results["encoding.%s" % path])
+        self.assertGreater(results["send.rate500.pps50"]["received"], 0)
+        self.assertEqual(results["send.rate500.pps50"]["lost"], 0)
+        self.assertGreater(results["send.rate500.pps50"]["targetFraction"], 0.8)
+        self.assertLess(results["send.rate500.pps50"]["targetFraction"], 1.1)
+        self.assertGreater(results["send.max.pps50"]["throughput"], 2 * results["send.rate500.pps50"]["throughput"])
+        self.assertEqual(compareToBaseline(current, current), [])
+
+
+
+if __name__ == '__main__':
+    sys.exit(main())